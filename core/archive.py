@@ -0,0 +1,59 @@
+from django.db import transaction as db_transaction
+
+from core.database import retry_on_lock
+from core.models import ArchivedTransaction, Transaction
+from core.versions import TRANSACTIONS, account_scope, bump_versions
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _newest_archived():
+    return ArchivedTransaction.objects.order_by('-Date').values_list('Date', flat=True)
+
+
+def archived_until():
+    """
+    Date of the newest archived transaction, or None while the archive is
+    empty. Every transaction dated after it is in the hot table.
+    """
+    return _newest_archived().first()
+
+
+async def aarchived_until():
+    """Async version of archived_until()."""
+    return await _newest_archived().afirst()
+
+
+def reaches_archive(boundary, start=None, end=None):
+    """
+    Whether transactions dated from ``start`` to before ``end`` can include
+    archived ones, given the archived_until() ``boundary``. Without any date
+    bound the views show recent activity only, so the archive is left out.
+    """
+    if boundary is None or (start is None and end is None):
+        return False
+    return start is None or start <= boundary
+
+
+@retry_on_lock
+def archive_chunk(before, size=DEFAULT_CHUNK_SIZE):
+    """
+    Move up to ``size`` of the oldest transactions dated before ``before``
+    into the archive in one atomic block, and return how many were moved.
+
+    Balances, checkpoints and the daily rollup already include the moved rows
+    and stay as they are; only the ledger versions are bumped, because the
+    rows leave the default list and enquiry pages.
+    """
+    with db_transaction.atomic():
+        transactions = list(Transaction.objects.filter(Date__lt=before).order_by('Date', 'Number')[:size])
+        if not transactions:
+            return 0
+        ArchivedTransaction.objects.bulk_create(
+            ArchivedTransaction(Number=t.Number, Account_id=t.Account_id, Date=t.Date,
+                                Amount=t.Amount, DC=t.DC, Reference=t.Reference)
+            for t in transactions
+        )
+        Transaction.objects.filter(Number__in=[t.Number for t in transactions]).delete()
+        bump_versions([TRANSACTIONS, *map(account_scope, {t.Account_id for t in transactions})])
+    return len(transactions)
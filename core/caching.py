@@ -0,0 +1,75 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+from core.metrics import registry
+
+ENQUIRY_CUSTOMERS_KEY = 'core:enquiry_customer_list'
+
+# Everything rendered from customer rows (names and balances)
+CUSTOMER_CACHE_KEYS = [ENQUIRY_CUSTOMERS_KEY]
+
+DEFAULT_CUSTOMER_CACHE_TIMEOUT = 300
+
+# Part of every cached report key; replaced to drop all of them at once
+REPORT_GENERATION_KEY = 'core:report_generation'
+
+
+def cached_fragment(key, render):
+    """
+    Return the cached value for ``key``, calling ``render()`` to fill the
+    cache on a miss. Hits and misses are counted in the metrics registry.
+    """
+    value = cache.get(key)
+    if value is not None:
+        registry.record_cache(key, hit=True)
+        return value
+    registry.record_cache(key, hit=False)
+    value = render()
+    cache.set(key, value, getattr(settings, 'CUSTOMER_CACHE_TIMEOUT', DEFAULT_CUSTOMER_CACHE_TIMEOUT))
+    return value
+
+
+async def acached_fragment(key, render):
+    """Async version of cached_fragment(); ``render`` is a coroutine function."""
+    value = await cache.aget(key)
+    if value is not None:
+        registry.record_cache(key, hit=True)
+        return value
+    registry.record_cache(key, hit=False)
+    value = await render()
+    await cache.aset(key, value, getattr(settings, 'CUSTOMER_CACHE_TIMEOUT', DEFAULT_CUSTOMER_CACHE_TIMEOUT))
+    return value
+
+
+def invalidate_customer_caches():
+    """
+    Drop cached pages built from customer rows. Called on Customer saves and
+    deletes and on every balance update.
+
+    The keys are deleted straight away and again once the surrounding
+    transaction commits, so a request that reads the old rows while the
+    write is still uncommitted cannot leave them cached afterwards.
+    """
+    cache.delete_many(CUSTOMER_CACHE_KEYS)
+    db_transaction.on_commit(lambda: cache.delete_many(CUSTOMER_CACHE_KEYS))
+
+
+def report_cache_generation():
+    """
+    Token to include in report cache keys. A fresh token is made whenever the
+    old one is missing, so an evicted token can never revive stale entries.
+    """
+    return cache.get_or_set(REPORT_GENERATION_KEY, uuid4().hex, None)
+
+
+def invalidate_report_caches():
+    """
+    Drop every cached report by replacing the generation token. Called for
+    writes dated in periods that reports treat as closed. Like
+    invalidate_customer_caches(), it acts again once the transaction commits.
+    """
+    cache.set(REPORT_GENERATION_KEY, uuid4().hex, None)
+    db_transaction.on_commit(lambda: cache.set(REPORT_GENERATION_KEY, uuid4().hex, None))
@@ -0,0 +1,47 @@
+import logging
+import random
+import sqlite3
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection
+
+from core.metrics import registry
+
+logger = logging.getLogger('core.database')
+
+LOCK_RETRY_ATTEMPTS = 5
+LOCK_RETRY_BASE_DELAY = 0.05
+
+
+def is_lock_error(error):
+    """True for SQLite's "database is locked" / "database table is locked" errors."""
+    return isinstance(error, (OperationalError, sqlite3.OperationalError)) and 'is locked' in str(error)
+
+
+def retry_on_lock(func=None, *, attempts=LOCK_RETRY_ATTEMPTS, base_delay=LOCK_RETRY_BASE_DELAY):
+    """
+    Decorator re-running a write with exponential backoff and jitter when
+    SQLite still reports the database locked after busy_timeout.
+
+    The decorated function has to open (and so roll back) its own
+    transaction. Called inside an atomic block, the error is raised straight
+    away: the enclosing transaction is the one that has to be retried.
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except (OperationalError, sqlite3.OperationalError) as e:
+                    if attempt == attempts or not is_lock_error(e) or connection.in_atomic_block:
+                        raise
+                    delay = base_delay * 2 ** (attempt - 1) * random.uniform(1, 1.5)
+                    registry.record_lock_retry()
+                    logger.warning('%s: database locked, retry %d of %d in %.0f ms',
+                                   func.__qualname__, attempt, attempts - 1, delay * 1000)
+                    time.sleep(delay)
+        return inner
+
+    return decorator(func) if func else decorator
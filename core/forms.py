@@ -1,18 +1,124 @@
 from django import forms
-from core.models import Customer, Transaction
+from django.forms import BaseFormSet
+from django.forms.models import ModelChoiceIterator
+from django.utils.choices import BaseChoiceIterator
+from django.utils.functional import cached_property
+from core.models import ArchivedTransaction, Customer, Transaction
+from core.references import next_reference
+from core.validation import validate_client_reference, validate_transaction_batch
 
 class CustomerForm(forms.ModelForm):
     class Meta:
         model = Customer
         fields = ['Name']
 
+class CustomerChoiceField(forms.ModelChoiceField):
+    """
+    Account choice field that can resolve submitted values from a dict of
+    customers preloaded by a formset instead of one query per form.
+    """
+    customers = None
+
+    def to_python(self, value):
+        if self.customers is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.customers[value]
+        except (KeyError, TypeError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+
+class SharedChoiceIterator(BaseChoiceIterator):
+    """Evaluates a model choice field's choices once, for every form that renders them."""
+
+    def __init__(self, field):
+        self.field = field
+        self.choices = None
+
+    def __iter__(self):
+        if self.choices is None:
+            # Not list(), which asks the iterator for its length with a COUNT query
+            self.choices = [choice for choice in ModelChoiceIterator(self.field)]
+        return iter(self.choices)
+
 class TransactionForm(forms.ModelForm):
     class Meta:
         model = Transaction
         fields = ['Account', 'Date', 'Amount', 'DC', 'Reference']
+        field_classes = {
+            'Account': CustomerChoiceField,
+        }
         widgets = {
             'Date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'Reference': forms.TextInput(attrs={'placeholder': 'Generated if blank'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['Reference'].required = False
+
+    def clean_Reference(self):
+        reference = self.cleaned_data['Reference']
+        # An edit may keep the generated reference it already has
+        if reference and reference != self.instance.Reference:
+            validate_client_reference(reference)
+        # A blank reference on a new transaction gets the next generated one
+        return reference or self.instance.Reference or next_reference()
+
+    # Set by BulkTransactionFormSet, which resolves accounts and checks
+    # references for the whole batch at once
+    batch_validation = False
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.batch_validation:
+            # The account was already looked up and the reference format is
+            # checked for the batch, skip the model's per-row checks
+            exclude.update(['Account', 'Reference'])
+        return exclude
+
+    def validate_unique(self):
+        if self.batch_validation:
+            return
+        super().validate_unique()
+        reference = self.cleaned_data.get('Reference')
+        if reference and 'Reference' not in self.errors and \
+                ArchivedTransaction.objects.filter(Reference=reference).exists():
+            self.add_error('Reference', self.instance.unique_error_message(Transaction, ['Reference']))
+
+class BulkTransactionFormSet(BaseFormSet):
+    """
+    Validates and renders any number of transaction rows with a fixed number
+    of queries: the submitted rows go through validate_transaction_batch()
+    (accounts loaded in one query, references checked in one query), and the
+    account choices are read once and shared by every row.
+    """
+
+    @cached_property
+    def account_choices(self):
+        return SharedChoiceIterator(self.form.base_fields['Account'])
+
+    @cached_property
+    def batch(self):
+        return validate_transaction_batch([
+            {field: self.data.get(f'{self.add_prefix(i)}-{field}') for field in ('Account', 'Reference')}
+            for i in range(self.total_form_count())
+        ])
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['Account'].widget.choices = self.account_choices
+        if self.is_bound:
+            form.fields['Account'].customers = self.batch.customers
+            form.batch_validation = True
+        return form
+
+    def clean(self):
+        # Unknown accounts are already reported by the Account field
+        for i, form in enumerate(self.forms):
+            errors = self.batch.row_errors(i).get('Reference')
+            if errors and 'Reference' not in form.errors:
+                form.add_error('Reference', errors)
+
 # TransactionFormSet will be created dynamically in the view
-# TransactionFormSet = formset_factory(TransactionForm, extra=3)
\ No newline at end of file
+# TransactionFormSet = formset_factory(TransactionForm, extra=3)
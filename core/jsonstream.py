@@ -0,0 +1,85 @@
+import codecs
+import json
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder(parse_float=str)
+_WHITESPACE = ' \t\n\r'
+_SEPARATORS = _WHITESPACE + ',]'
+
+
+class InputTooLarge(ValueError):
+    """Raised by iter_json_array() once the input exceeds its ``max_bytes``."""
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE, max_bytes=None):
+    """
+    Yield the elements of a JSON array read from the file-like ``stream``,
+    decoding each one as soon as it has arrived. Only the unparsed tail of the
+    input is kept in memory, so a large request body is never held as one
+    string next to its parsed rows. Numbers with a fraction are returned as
+    strings, leaving the caller to parse them as Decimal.
+
+    Raises ValueError for malformed input, including anything but an array at
+    the top level, and InputTooLarge as soon as more than ``max_bytes`` bytes
+    have been read.
+    """
+    decode = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+    total = 0
+
+    def fill():
+        nonlocal buffer, pos, eof, total
+        size = chunk_size if max_bytes is None else min(chunk_size, max_bytes - total + 1)
+        chunk = stream.read(size)
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise InputTooLarge(f'The input is larger than {max_bytes} bytes.')
+        eof = not chunk
+        buffer = buffer[pos:] + decode.decode(chunk, final=eof)
+        pos = 0
+
+    def next_token():
+        # Skip whitespace, reading more input until a token or the end
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            fill()
+
+    if next_token() != '[':
+        raise ValueError('Expected a JSON array.')
+    pos += 1
+    if next_token() == ']':
+        pos += 1
+    else:
+        while True:
+            next_token()
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if not eof and (end == len(buffer) or buffer[end] not in _SEPARATORS):
+                # A number cut off by the chunk boundary ("3." or "12") may
+                # continue in the next chunk
+                fill()
+                continue
+            pos = end
+            yield value
+
+            token = next_token()
+            pos += 1
+            if token == ']':
+                break
+            if token != ',':
+                raise ValueError('Expected "," or "]" after an array element.')
+
+    if next_token():
+        raise ValueError('Unexpected data after the JSON array.')
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from core.caching import invalidate_customer_caches, invalidate_report_caches
+from core.database import retry_on_lock
+from core.versions import CUSTOMERS, TRANSACTIONS, account_scope, bump_versions
+from core.models import ArchivedTransaction, BalanceCheckpoint, Customer, DailyAccountTotals, Transaction
+from core.timeseries import closes_report_periods
+
+# Accounts per CASE update, keeps the statement well inside SQLite's
+# host parameter limit
+BALANCE_UPDATE_BATCH_SIZE = 500
+
+
+def signed_amount(dc, amount):
+    """Balance effect of a transaction: debits add, credits subtract."""
+    if dc == 'D':
+        return amount
+    elif dc == 'C':
+        return -amount
+    return Decimal('0')
+
+
+def signed_amount_expression():
+    """Database-side equivalent of signed_amount for aggregates."""
+    return Case(
+        When(DC='D', then=F('Amount')),
+        When(DC='C', then=-F('Amount')),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def sum_signed_amounts(transactions):
+    """Net balance effect of a Transaction queryset, computed in the database."""
+    total = transactions.aggregate(total=Sum(signed_amount_expression()))['total']
+    return total or Decimal('0')
+
+
+def balance_deltas(transactions):
+    """Sum the balance effect of ``transactions`` per account number."""
+    deltas = defaultdict(Decimal)
+    for transaction in transactions:
+        deltas[transaction.Account_id] += signed_amount(transaction.DC, transaction.Amount)
+    return deltas
+
+
+def apply_balance_deltas(deltas):
+    """
+    Add each account's delta to Customer.Balance with one
+    ``UPDATE ... SET Balance = Balance + CASE Account WHEN ... END`` per batch,
+    so the adjustment is done in the database rather than read-modify-write.
+    """
+    accounts = [account for account, delta in deltas.items() if delta]
+    for start in range(0, len(accounts), BALANCE_UPDATE_BATCH_SIZE):
+        batch = accounts[start:start + BALANCE_UPDATE_BATCH_SIZE]
+        delta_case = Case(
+            *[When(Account=account, then=Value(deltas[account])) for account in batch],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        Customer.objects.filter(Account__in=batch).update(Balance=F('Balance') + delta_case)
+    if accounts:
+        invalidate_customer_caches()
+
+
+def earliest_dates(transactions):
+    """Earliest transaction date per account number."""
+    dates = {}
+    for transaction in transactions:
+        account = transaction.Account_id
+        if account not in dates or transaction.Date < dates[account]:
+            dates[account] = transaction.Date
+    return dates
+
+
+def invalidate_checkpoints(account_dates):
+    """
+    Drop balance checkpoints made stale by a write dated at or before them.
+    ``account_dates`` maps account numbers to the earliest affected date.
+    """
+    accounts = list(account_dates)
+    for start in range(0, len(accounts), BALANCE_UPDATE_BATCH_SIZE):
+        stale = Q()
+        for account in accounts[start:start + BALANCE_UPDATE_BATCH_SIZE]:
+            stale |= Q(Account=account, Date__gte=account_dates[account])
+        BalanceCheckpoint.objects.filter(stale).delete()
+
+
+def balance_at(customer, when):
+    """
+    Balance of ``customer`` including every transaction dated at or before
+    ``when``.
+
+    Starts from the nearest checkpoint (or the current balance when the
+    account has none) and sums only the transactions between it and ``when``,
+    so the cost is bounded by checkpoint spacing rather than account history.
+    Archived transactions count too; their (Account, Date) index makes the
+    archive's share a single seek when the range is newer than it.
+    """
+    def net(**dates):
+        return sum(sum_signed_amounts(model.objects.filter(Account=customer, **dates))
+                   for model in (Transaction, ArchivedTransaction))
+
+    checkpoints = BalanceCheckpoint.objects.filter(Account=customer)
+
+    before = checkpoints.filter(Date__lte=when).order_by('-Date').first()
+    if before:
+        return before.Balance + net(Date__gt=before.Date, Date__lte=when)
+
+    after = checkpoints.filter(Date__gt=when).order_by('Date').first()
+    if after:
+        return after.Balance - net(Date__gt=when, Date__lte=after.Date)
+
+    return customer.Balance - net(Date__gt=when)
+
+
+def transaction_day(date):
+    """Calendar day a transaction is rolled up under, in the current time zone."""
+    if timezone.is_aware(date):
+        date = timezone.localtime(date)
+    return date.date()
+
+
+def rollup_deltas(added=(), removed=()):
+    """Per (account, day) changes to [debit total, credit total, count]."""
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    for transactions, sign in ((added, 1), (removed, -1)):
+        for transaction in transactions:
+            delta = deltas[(transaction.Account_id, transaction_day(transaction.Date))]
+            if transaction.DC == 'D':
+                delta[0] += sign * transaction.Amount
+            elif transaction.DC == 'C':
+                delta[1] += sign * transaction.Amount
+            delta[2] += sign
+    return deltas
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Add ``deltas`` to DailyAccountTotals with a single batched upsert
+    (INSERT ... ON CONFLICT DO UPDATE), creating missing days as needed.
+    """
+    rows = [
+        (account, day, debit, credit, count)
+        for (account, day), (debit, credit, count) in deltas.items()
+        if debit or credit or count
+    ]
+    if not rows:
+        return
+    table = DailyAccountTotals._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ("Account_id", "Day", "DebitTotal", "CreditTotal", "Count") '
+            f'VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT ("Account_id", "Day") DO UPDATE SET '
+            f'"DebitTotal" = {table}."DebitTotal" + excluded."DebitTotal", '
+            f'"CreditTotal" = {table}."CreditTotal" + excluded."CreditTotal", '
+            f'"Count" = {table}."Count" + excluded."Count"',
+            rows
+        )
+
+
+def apply_ledger_effects(added=(), removed=()):
+    """
+    Bring every derived figure in line with transactions that were written
+    (``added``) or deleted / replaced (``removed``, with their stored values):
+    customer balances, balance checkpoints, the daily rollup and reports
+    cached from it, and the ledger versions used for conditional GETs.
+    Callers run it in the same atomic block as the transaction write.
+    """
+    added = list(added)
+    removed = list(removed)
+
+    deltas = balance_deltas(added)
+    for account, delta in balance_deltas(removed).items():
+        deltas[account] -= delta
+    apply_balance_deltas(deltas)
+
+    dates = earliest_dates(added)
+    for account, date in earliest_dates(removed).items():
+        if account not in dates or date < dates[account]:
+            dates[account] = date
+    invalidate_checkpoints(dates)
+
+    apply_rollup_deltas(rollup_deltas(added, removed))
+    if closes_report_periods(added + removed):
+        invalidate_report_caches()
+
+    accounts = {transaction.Account_id for transaction in added + removed}
+    if accounts:
+        balances_changed = [CUSTOMERS] if any(deltas.values()) else []
+        bump_versions([TRANSACTIONS, *balances_changed, *map(account_scope, accounts)])
+
+
+@retry_on_lock
+def post_transactions(transactions):
+    """
+    Insert ``transactions`` with bulk_create and apply their balance effect in
+    a single atomic block. The number of queries depends on the batch size
+    only through SQLite's parameter limit, not per row.
+    """
+    transactions = list(transactions)
+    for transaction in transactions:
+        # A retry inserts afresh: Numbers given to a rolled back attempt may
+        # have been taken by other writers since
+        transaction.pk = None
+    with db_transaction.atomic():
+        created = Transaction.objects.bulk_create(transactions)
+        apply_ledger_effects(added=created)
+    return created
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.archive import DEFAULT_CHUNK_SIZE, archive_chunk
+
+
+class Command(BaseCommand):
+    help = ('Moves transactions older than --older-than days from the Transaction table into the archive, '
+            'one chunk per database transaction. Balances and rollups are unchanged.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True,
+                            help='Archive transactions dated more than this many days ago.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Transactions moved per database transaction.')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than must not be negative.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        before = timezone.now() - timedelta(days=options['older_than'])
+
+        # Each chunk commits on its own, so writers are only held up for one
+        # chunk at a time and an interrupted run can simply be repeated
+        archived = 0
+        while True:
+            moved = archive_chunk(before, options['chunk_size'])
+            if not moved:
+                break
+            archived += moved
+            self.stderr.write(f'Archived {archived} transactions...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} transactions dated before {before:%Y-%m-%d %H:%M}.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from core.models import Customer, CustomerNameKey
+from core.phonetics import name_keys
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the phonetic name keys used by fuzzy customer search, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of customers processed per database transaction.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk = 0
+        processed = 0
+
+        while True:
+            # Walk the table by primary key so each chunk is an index range read
+            chunk = list(
+                Customer.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'Name')[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            with transaction.atomic():
+                pks = [pk for pk, _ in chunk]
+                CustomerNameKey.objects.filter(Customer_id__in=pks).delete()
+                CustomerNameKey.objects.bulk_create(
+                    CustomerNameKey(Customer_id=pk, Key=key)
+                    for pk, name in chunk
+                    for key in name_keys(name)
+                )
+
+            last_pk = chunk[-1][0]
+            processed += len(chunk)
+            self.stdout.write(f'Processed {processed} customers...')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled name keys for {processed} customers.'))
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.database import is_lock_error, retry_on_lock
+from core.metrics import registry
+
+CUSTOMERS = 50
+
+LIST_QUERY = (
+    'SELECT t."Number", t."Reference", t."Date", t."Amount", c."Name" '
+    'FROM core_transaction t JOIN core_customer c ON c."Account" = t."Account_id" '
+    'ORDER BY t."Date" DESC, t."Number" DESC LIMIT 50'
+)
+
+
+class Command(BaseCommand):
+    help = ('Runs concurrent writer and reader threads against a scratch copy of the schema, once with '
+            "SQLite's defaults and once with the settings.DATABASES profile, and reports throughput, "
+            'latency and lock errors for each as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads.')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads.')
+        parser.add_argument('--writes', type=int, default=200, help='Transactions posted per writer.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['writes'] < 2 or options['readers'] < 0:
+            raise CommandError('Use at least one writer and two writes per writer.')
+
+        db_options = settings.DATABASES['default'].get('OPTIONS', {})
+        profiles = [
+            # Django's SQLite defaults: rollback journal, deferred transactions,
+            # the sqlite3 module's 5 second busy timeout and no retries
+            {'name': 'default', 'pragmas': [], 'begin': 'BEGIN', 'timeout': 5, 'retry': False},
+            {'name': 'configured',
+             'pragmas': [p.strip() for p in db_options.get('init_command', '').split(';') if p.strip()],
+             'begin': f'BEGIN {db_options.get("transaction_mode", "")}'.strip(),
+             'timeout': db_options.get('timeout', 5), 'retry': True},
+        ]
+        schema = self.schema()
+
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in profiles:
+                path = os.path.join(directory, f'{profile["name"]}.sqlite3')
+                self.create_database(path, schema)
+                results.append(self.run_profile(path, profile, options))
+                self.stderr.write(
+                    f"{profile['name']}: {results[-1]['writes_per_second']} writes/s "
+                    f"({results[-1]['write_errors']} failed), {results[-1]['reads_per_second']} reads/s, "
+                    f"read p95 {results[-1]['read_p95_ms']} ms")
+
+        output = json.dumps({'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f'Wrote contention report to {options["output"]}.'))
+        else:
+            self.stdout.write(output)
+
+    def schema(self):
+        """CREATE statements of the app's database, skipping FTS5 shadow tables."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END"
+            )
+            rows = cursor.fetchall()
+        virtual = [name for _, name, sql in rows if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+        return [sql for _, name, sql in rows if not any(name.startswith(f'{v}_') for v in virtual)]
+
+    def create_database(self, path, schema):
+        db = sqlite3.connect(path, isolation_level=None)
+        try:
+            db.executescript(';\n'.join(schema) + ';')
+            db.executemany(
+                'INSERT INTO core_customer ("Account", "Name", "Balance") VALUES (?, ?, ?)',
+                [(f'CONTENTION{i:05d}', f'Contention {i}', '0.00') for i in range(CUSTOMERS)]
+            )
+        finally:
+            db.close()
+
+    def connect(self, path, profile):
+        db = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+        for pragma in profile['pragmas']:
+            db.execute(pragma)
+        return db
+
+    def run_profile(self, path, profile, options):
+        write_times, read_times = [], []
+        errors = {'write': 0, 'read': 0}
+        lock = threading.Lock()
+        writing = threading.Event()
+        writing.set()
+
+        def post(db, writer, n):
+            # Read-modify-write as the transaction views do: the balance read
+            # comes first, so a deferred transaction has to upgrade its lock
+            account = f'CONTENTION{(writer * 7 + n) % CUSTOMERS:05d}'
+            db.execute(profile['begin'])
+            try:
+                db.execute('SELECT "Balance" FROM core_customer WHERE "Account" = ?', [account]).fetchone()
+                db.execute(
+                    'INSERT INTO core_transaction ("Account_id", "Date", "Amount", "DC", "Reference") '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [account, datetime.now(timezone.utc).isoformat(), '1.00', 'D', f'C{writer:03d}{n:06d}'])
+                db.execute('UPDATE core_customer SET "Balance" = "Balance" + 1 WHERE "Account" = ?', [account])
+                db.execute('COMMIT')
+            except BaseException:
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                raise
+
+        write = retry_on_lock(post) if profile['retry'] else post
+
+        def writer(index):
+            db = self.connect(path, profile)
+            try:
+                for n in range(options['writes']):
+                    start = time.perf_counter()
+                    try:
+                        write(db, index, n)
+                    except sqlite3.OperationalError as e:
+                        if not is_lock_error(e):
+                            raise
+                        with lock:
+                            errors['write'] += 1
+                        continue
+                    with lock:
+                        write_times.append(time.perf_counter() - start)
+            finally:
+                db.close()
+
+        def reader():
+            db = self.connect(path, profile)
+            try:
+                while writing.is_set():
+                    start = time.perf_counter()
+                    try:
+                        db.execute(LIST_QUERY).fetchall()
+                    except sqlite3.OperationalError as e:
+                        if not is_lock_error(e):
+                            raise
+                        with lock:
+                            errors['read'] += 1
+                        continue
+                    with lock:
+                        read_times.append(time.perf_counter() - start)
+            finally:
+                db.close()
+
+        retries_before = registry.lock_retries
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        start = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        writing.clear()
+        for thread in readers:
+            thread.join()
+
+        return {
+            'profile': profile['name'],
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'seconds': round(elapsed, 3),
+            'writes': len(write_times),
+            'write_errors': errors['write'],
+            'write_retries': registry.lock_retries - retries_before,
+            'writes_per_second': round(len(write_times) / elapsed, 1),
+            'write_p95_ms': _p95_ms(write_times),
+            'reads': len(read_times),
+            'read_errors': errors['read'],
+            'reads_per_second': round(len(read_times) / elapsed, 1),
+            'read_p95_ms': _p95_ms(read_times),
+        }
+
+
+def _p95_ms(timings):
+    if len(timings) < 2:
+        return None
+    return round(statistics.quantiles(timings, n=100, method='inclusive')[94] * 1000, 3)
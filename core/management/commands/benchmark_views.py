@@ -0,0 +1,166 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Customer, Transaction
+from core.urls import urlpatterns
+
+
+class Command(BaseCommand):
+    help = ('Requests every URL in core/urls.py through the test client and reports latency '
+            'percentiles, query counts and peak memory as JSON. Writes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per scenario.')
+        parser.add_argument('--bulk-rows', type=int, default=100, help='Rows posted by the bulk add scenario.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('--requests must be at least 2.')
+        customer = Customer.objects.order_by('pk').first()
+        transaction_row = Transaction.objects.order_by('pk').first()
+        if customer is None or transaction_row is None:
+            raise CommandError('The database needs at least one customer and transaction. Run generate_data first.')
+
+        host = settings.ALLOWED_HOSTS[0].lstrip('.') if settings.ALLOWED_HOSTS else 'localhost'
+        self.client = Client(HTTP_HOST=host)
+
+        report = {
+            'dataset': {
+                'customers': Customer.objects.count(),
+                'transactions': Transaction.objects.count(),
+            },
+            'scenarios': [
+                self.run_scenario(scenario, options['requests'])
+                for scenario in self.scenarios(customer, transaction_row, options['bulk_rows'])
+            ],
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f'Wrote benchmark report to {options["output"]}.'))
+        else:
+            self.stdout.write(output)
+
+    def scenarios(self, customer, transaction_row, bulk_rows):
+        """One request per named URL in core/urls.py, plus list variants and a bulk post."""
+        sample_kwargs = {
+            'customer': {'pk': customer.pk},
+            'transaction': {'pk': transaction_row.pk},
+            'enquiry': {'account_number': customer.Account},
+        }
+        # POST-only endpoints, requested with a JSON body
+        json_posts = {'transaction_batch': self.batch_data(customer, bulk_rows)}
+        scenarios = []
+        for pattern in urlpatterns:
+            kwargs = {}
+            if pattern.pattern.converters:
+                kwargs = sample_kwargs[pattern.name.split('_')[0]]
+            url = reverse(pattern.name, kwargs=kwargs)
+            if pattern.name in json_posts:
+                scenarios.append({'name': pattern.name, 'method': 'POST', 'url': url,
+                                  'data': json.dumps(json_posts[pattern.name]), 'content_type': 'application/json'})
+            else:
+                scenarios.append({'name': pattern.name, 'method': 'GET', 'url': url, 'data': None})
+
+        list_url = reverse('transaction_list')
+        scenarios += [
+            {'name': 'transaction_list:search', 'method': 'GET', 'url': list_url,
+             'data': {'q': transaction_row.Reference}},
+            {'name': 'transaction_list:sort_amount', 'method': 'GET', 'url': list_url,
+             'data': {'sort_by': 'Amount', 'order': 'desc'}},
+            {'name': 'transaction_list:date_range', 'method': 'GET', 'url': list_url,
+             'data': {'start_date': transaction_row.Date.strftime('%Y-%m-%d')}},
+            {'name': 'customer_list:search', 'method': 'GET', 'url': reverse('customer_list'),
+             'data': {'q': customer.Name.split()[0]}},
+            {'name': 'bulk_add_transactions:post', 'method': 'POST', 'url': reverse('bulk_add_transactions'),
+             'data': self.bulk_add_data(customer, bulk_rows)},
+        ]
+        return scenarios
+
+    def bulk_add_data(self, customer, rows):
+        data = {
+            'form-TOTAL_FORMS': str(rows),
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': str(rows),
+        }
+        for i in range(rows):
+            data.update({
+                f'form-{i}-Account': customer.Account,
+                f'form-{i}-Date': '2025-01-01 12:00:00',
+                f'form-{i}-Amount': '1.00',
+                f'form-{i}-DC': 'D' if i % 2 else 'C',
+                f'form-{i}-Reference': f'BENCH{i:05d}',
+            })
+        return data
+
+    def batch_data(self, customer, rows):
+        return [
+            {'Account': customer.Account, 'Date': '2025-01-01T12:00:00', 'Amount': '1.00',
+             'DC': 'D' if i % 2 else 'C', 'Reference': f'BATCH{i:05d}'}
+            for i in range(rows)
+        ]
+
+    def request(self, scenario):
+        method = getattr(self.client, scenario['method'].lower())
+        # Every request runs in a transaction that is rolled back, so write
+        # scenarios can repeat and leave the database untouched
+        with transaction.atomic():
+            kwargs = {'content_type': scenario['content_type']} if 'content_type' in scenario else {}
+            response = method(scenario['url'], scenario['data'], **kwargs)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            transaction.set_rollback(True)
+        return response
+
+    def run_scenario(self, scenario, requests):
+        self.request(scenario)  # Warm up caches and lazy imports
+
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = self.request(scenario)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.request(scenario)
+        # Savepoint and transaction statements come from the rollback wrapper
+        queries = [q for q in ctx.captured_queries if not q['sql'].upper().startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN'))]
+
+        tracemalloc.start()
+        try:
+            self.request(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        result = {
+            'name': scenario['name'],
+            'method': scenario['method'],
+            'url': scenario['url'],
+            'status': response.status_code,
+            'requests': requests,
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': len(queries),
+            'query_time_ms': round(sum(float(q['time']) for q in queries) * 1000, 3),
+            'peak_memory_bytes': peak,
+        }
+        self.stderr.write(f"{result['name']}: p50 {result['p50_ms']} ms, {result['queries']} queries")
+        return result
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from core.ledger import signed_amount, signed_amount_expression
+from core.models import ArchivedTransaction, BalanceCheckpoint, Customer, Transaction
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds per-customer balance checkpoints used for point-in-time balance enquiries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Checkpoint spacing in days. Each account gets at most one checkpoint per period.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Number of checkpoints inserted per query.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+        period = timedelta(days=options['days'])
+        batch_size = options['batch_size']
+
+        # Customer.Balance includes the opening balance, so the balance before
+        # any transaction is the current balance minus every transaction
+        # Archived transactions are part of the history too
+        totals = defaultdict(Decimal)
+        for model in (Transaction, ArchivedTransaction):
+            for account, total in (model.objects.values_list('Account_id')
+                                   .annotate(total=Sum(signed_amount_expression()))
+                                   .order_by()):
+                totals[account] += total
+        opening = {
+            account: balance - totals.get(account, 0)
+            for account, balance in Customer.objects.filter(Account__in=totals).values_list('Account', 'Balance')
+        }
+
+        created = 0
+        with transaction.atomic():
+            BalanceCheckpoint.objects.all().delete()
+
+            pending = []
+            account = running = last = None
+            fields = ('Account_id', 'Date', 'DC', 'Amount', 'Number')
+            rows = (Transaction.objects.values_list(*fields)
+                    .union(ArchivedTransaction.objects.values_list(*fields), all=True)
+                    .order_by('Account_id', 'Date', 'Number')
+                    .iterator(chunk_size=batch_size))
+            for row_account, date, dc, amount, _ in rows:
+                if row_account != account:
+                    if account is not None:
+                        pending.append(BalanceCheckpoint(Account_id=account, Date=last, Balance=running))
+                    account, running = row_account, opening[row_account]
+                elif (date - EPOCH) // period != (last - EPOCH) // period:
+                    # Close the previous period at its last transaction
+                    pending.append(BalanceCheckpoint(Account_id=account, Date=last, Balance=running))
+
+                running += signed_amount(dc, amount)
+                last = date
+
+                if len(pending) >= batch_size:
+                    BalanceCheckpoint.objects.bulk_create(pending)
+                    created += len(pending)
+                    pending = []
+
+            if account is not None:
+                pending.append(BalanceCheckpoint(Account_id=account, Date=last, Balance=running))
+            BalanceCheckpoint.objects.bulk_create(pending)
+            created += len(pending)
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} balance checkpoints.'))
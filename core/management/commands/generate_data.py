@@ -0,0 +1,130 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.ledger import post_transactions
+from core.models import Customer, CustomerNameKey, Transaction
+from core.phonetics import name_keys
+from core.versions import CUSTOMERS, bump_versions
+
+FIRST_NAMES = [
+    'Alice', 'Bob', 'Carol', 'David', 'Erin', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy',
+    'Karl', 'Laura', 'Mallory', 'Niaj', 'Olivia', 'Peggy', 'Quentin', 'Rupert', 'Sybil', 'Trent',
+    'Ursula', 'Victor', 'Walter', 'Xena', 'Yusuf', 'Zara',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+    'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor',
+    'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez',
+]
+
+
+class Command(BaseCommand):
+    help = 'Generates a large synthetic dataset of customers and transactions using bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000, help='Number of customers to create.')
+        parser.add_argument('--transactions', type=int, default=100000, help='Number of transactions to create.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible datasets.')
+        parser.add_argument('--days', type=int, default=730, help='How far back transaction dates go.')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent for account activity; 0 spreads transactions evenly.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per batch.')
+        parser.add_argument('--prefix', default='G',
+                            help='Prefix for generated account numbers and references (letters only).')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix'].upper()
+        if not prefix.isalpha() or len(prefix) > 3:
+            raise CommandError('--prefix must be one to three letters.')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        customers = self.create_customers(rng, options['customers'], prefix, batch_size)
+        if not customers:
+            customers = list(Customer.objects.values_list('Account', flat=True))
+        if not customers:
+            raise CommandError('No customers available to post transactions to.')
+        self.create_transactions(rng, customers, options, prefix, batch_size)
+
+    def next_number(self, model, field, prefix):
+        # Continue after the highest existing generated value so re-runs do not collide
+        last = (model.objects.filter(**{f'{field}__startswith': prefix})
+                .order_by(f'-{field}').values_list(field, flat=True).first())
+        if last and last[len(prefix):].isdigit():
+            return int(last[len(prefix):]) + 1
+        return 0
+
+    def create_customers(self, rng, count, prefix, batch_size):
+        width = 15 - len(prefix)
+        start = self.next_number(Customer, 'Account', prefix)
+        accounts = []
+        for batch_start in range(0, count, batch_size):
+            batch = []
+            for n in range(start + batch_start, start + min(batch_start + batch_size, count)):
+                balance = Decimal(rng.randint(0, 500000)) / 100
+                batch.append(Customer(
+                    Account=f'{prefix}{n:0{width}d}',
+                    Name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    Balance=balance,
+                    OpeningBalance=balance,
+                ))
+            with transaction.atomic():
+                created = Customer.objects.bulk_create(batch)
+                # bulk_create skips Customer.save(), so store the name keys here
+                CustomerNameKey.objects.bulk_create(
+                    CustomerNameKey(Customer=customer, Key=key)
+                    for customer in created
+                    for key in name_keys(customer.Name)
+                )
+                bump_versions([CUSTOMERS])
+            accounts.extend(customer.Account for customer in created)
+            self.stdout.write(f'Created {len(accounts)} customers...')
+        return accounts
+
+    def create_transactions(self, rng, accounts, options, prefix, batch_size):
+        count = options['transactions']
+        width = 10 - len(prefix)
+        start = self.next_number(Transaction, 'Reference', prefix)
+        if start + count > 10 ** width:
+            raise CommandError(f'Not enough {prefix} references left for {count} transactions.')
+
+        # Zipf-like activity: a few accounts receive most of the postings
+        rng.shuffle(accounts)
+        cum_weights = list(_cumulative(1 / (rank ** options['skew']) for rank in range(1, len(accounts) + 1)))
+        now = timezone.now()
+        max_days = options['days']
+
+        created = 0
+        for batch_start in range(0, count, batch_size):
+            batch_accounts = rng.choices(accounts, cum_weights=cum_weights, k=min(batch_size, count - batch_start))
+            batch = []
+            for offset, account in enumerate(batch_accounts):
+                # Recent activity dominates; amounts are log-normal, debits more common
+                days_ago = min(rng.expovariate(1 / 90), max_days)
+                amount = min(math.exp(rng.gauss(3.5, 1.2)), 99999999)
+                batch.append(Transaction(
+                    Account_id=account,
+                    Date=now - timedelta(days=days_ago),
+                    Amount=Decimal(f'{amount:.2f}'),
+                    DC='D' if rng.random() < 0.6 else 'C',
+                    Reference=f'{prefix}{start + batch_start + offset:0{width}d}',
+                ))
+            post_transactions(batch)
+            created += len(batch)
+            self.stdout.write(f'Created {created} transactions...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(accounts)} customers and {created} transactions.'))
+
+
+def _cumulative(values):
+    total = 0
+    for value in values:
+        total += value
+        yield total
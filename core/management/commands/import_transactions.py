@@ -0,0 +1,192 @@
+import csv
+import itertools
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.database import retry_on_lock
+from core.ledger import post_transactions
+from core.models import ImportCheckpoint, Transaction
+from core.references import allocate_references
+from core.validation import validate_transaction_batch
+
+FIELDS = ['Account', 'Date', 'Amount', 'DC', 'Reference']
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield row
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Reported as an invalid row rather than aborting the import
+            yield None
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+def build_transaction(row):
+    """Turn a raw input row into an unsaved Transaction, checking formats only."""
+    if not isinstance(row, dict):
+        raise ValidationError('Row is not a JSON object.')
+    # Rows without a Reference get a generated one once the chunk is validated
+    missing = [field for field in FIELDS if field != 'Reference' and not row.get(field)]
+    if missing:
+        raise ValidationError(f'Missing fields: {", ".join(missing)}')
+
+    date = parse_datetime(str(row['Date']))
+    if date is None:
+        raise ValidationError(f'Invalid date: {row["Date"]}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+
+    try:
+        amount = Decimal(str(row['Amount']))
+    except InvalidOperation:
+        raise ValidationError(f'Invalid amount: {row["Amount"]}')
+
+    instance = Transaction(
+        Account_id=row['Account'],
+        Date=date,
+        Amount=amount,
+        DC=row['DC'],
+        Reference=row.get('Reference') or '',
+    )
+    # The account and reference are checked for the whole chunk at once by
+    # validate_transaction_batch()
+    instance.full_clean(exclude=['Account', 'Reference'], validate_unique=False)
+    return instance
+
+
+# Import log wording for the batch checks, naming the offending value
+BATCH_ERROR_MESSAGES = {
+    'unknown_account': 'Unknown account {Account}',
+    'unique': 'Duplicate reference {Reference}',
+    'duplicate': 'Duplicate reference {Reference}',
+}
+
+
+def describe_errors(instance, row_errors):
+    messages = []
+    for field_errors in row_errors.values():
+        for error in field_errors:
+            template = BATCH_ERROR_MESSAGES.get(error.code)
+            if template:
+                messages.append(template.format(Account=instance.Account_id, Reference=instance.Reference))
+            else:
+                messages.extend(error.messages)
+    return '; '.join(messages)
+
+
+class Command(BaseCommand):
+    help = 'Streams transactions from a CSV or NDJSON file into the database in resumable chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file of transactions.')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Input format. Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of rows validated and committed together.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any checkpoint and start from the first row.')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError(f'Unknown input format "{input_format}". Use --format.')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(Source=path)
+        if options['restart']:
+            checkpoint.RowsProcessed = 0
+            checkpoint.RowsImported = 0
+            checkpoint.save()
+        elif checkpoint.RowsProcessed:
+            self.stdout.write(self.style.WARNING(f'Resuming after row {checkpoint.RowsProcessed}.'))
+
+        errors = 0
+        with open(path, newline='', encoding='utf-8') as stream:
+            rows = READERS[input_format](stream)
+            # Rows before the checkpoint were committed by an earlier run
+            rows = itertools.islice(rows, checkpoint.RowsProcessed, None)
+            row_number = checkpoint.RowsProcessed
+
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                valid, chunk_errors = self.validate_chunk(chunk, row_number)
+                for message in chunk_errors:
+                    self.stderr.write(message)
+                errors += len(chunk_errors)
+                row_number += len(chunk)
+
+                self.commit_chunk(checkpoint, valid, row_number, checkpoint.RowsImported + len(valid))
+
+                self.stdout.write(f'Processed {row_number} rows...')
+
+        summary = f'Imported {checkpoint.RowsImported} transactions from {checkpoint.RowsProcessed} rows.'
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{summary} {errors} rows skipped.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    @retry_on_lock
+    def commit_chunk(self, checkpoint, valid, rows_processed, rows_imported):
+        # The checkpoint advances in the same transaction as the rows, so a
+        # killed import never re-posts a committed chunk
+        with transaction.atomic():
+            post_transactions(valid)
+            checkpoint.RowsProcessed = rows_processed
+            checkpoint.RowsImported = rows_imported
+            checkpoint.save()
+
+    def validate_chunk(self, chunk, first_row_number):
+        candidates = []
+        errors = []
+        for offset, row in enumerate(chunk, start=1):
+            row_number = first_row_number + offset
+            try:
+                candidates.append((row_number, build_transaction(row)))
+            except ValidationError as e:
+                errors.append(f'Row {row_number}: {e}')
+
+        batch = validate_transaction_batch(
+            {'Account': instance.Account_id, 'Reference': instance.Reference} for _, instance in candidates
+        )
+
+        valid = []
+        for index, (row_number, instance) in enumerate(candidates):
+            row_errors = batch.row_errors(index)
+            if row_errors:
+                errors.append(f'Row {row_number}: {describe_errors(instance, row_errors)}')
+            else:
+                valid.append(instance)
+
+        # Generated after validation, which refuses client references of the
+        # generated form
+        blank = [instance for instance in valid if not instance.Reference]
+        for instance, reference in zip(blank, allocate_references(len(blank))):
+            instance.Reference = reference
+        return valid, errors
@@ -0,0 +1,145 @@
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from core.models import Customer
+
+class Command(BaseCommand):
+    help = ('Drives the WSGI and ASGI applications in sales_app/ with concurrent requests to the '
+            'read-heavy views and reports throughput and latency for each as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per view and deployment.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path (with query string) to request. Repeatable; defaults to the list '
+                                 'and enquiry views.')
+        parser.add_argument('--host', default='localhost', help='Host header sent with each request.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2 or options['concurrency'] < 1:
+            raise CommandError('--requests must be at least 2 and --concurrency at least 1.')
+        paths = options['paths'] or self.default_paths()
+
+        # Imported here so settings are configured before the handlers load middleware
+        from sales_app.asgi import application as asgi_application
+        from sales_app.wsgi import application as wsgi_application
+
+        results = []
+        for path in paths:
+            for deployment, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                app = wsgi_application if deployment == 'wsgi' else asgi_application
+                run(app, options['host'], path, 1)  # Warm up
+                start = time.perf_counter()
+                outcomes = run(app, options['host'], path, options['requests'], options['concurrency'])
+                elapsed = time.perf_counter() - start
+                results.append(self.summarise(deployment, path, outcomes, elapsed, options['concurrency']))
+                self.stderr.write(f"{deployment} {path}: {results[-1]['requests_per_second']} req/s, "
+                                  f"p95 {results[-1]['p95_ms']} ms")
+
+        output = json.dumps({'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f'Wrote load test report to {options["output"]}.'))
+        else:
+            self.stdout.write(output)
+
+    def default_paths(self):
+        paths = [reverse('customer_list'), reverse('transaction_list'), reverse('enquiry_customer_list')]
+        account = Customer.objects.order_by('pk').values_list('Account', flat=True).first()
+        if account:
+            paths.append(reverse('enquiry_transaction_details', args=[account]))
+        return paths
+
+    def run_wsgi(self, application, host, path, requests, concurrency=1):
+        """Call the WSGI application from a pool of threads, like a threaded WSGI server."""
+        url = urlsplit(path)
+
+        def request(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+                'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                'wsgi.version': (1, 0),
+            }
+            status = []
+            start = time.perf_counter()
+            body = application(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            return status[0], time.perf_counter() - start
+
+        def close_connections():
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(request, range(requests)))
+            # Worker threads opened their own database connections
+            list(pool.map(lambda _: close_connections(), range(concurrency)))
+        return outcomes
+
+    def run_asgi(self, application, host, path, requests, concurrency=1):
+        """Call the ASGI application from one event loop, like a single ASGI server worker."""
+        url = urlsplit(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(),
+            'query_string': url.query.encode(), 'root_path': '',
+            'headers': [(b'host', host.encode())], 'server': (host, 80), 'client': ('127.0.0.1', 0),
+        }
+
+        async def request(semaphore):
+            async with semaphore:
+                status = []
+                body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+                async def receive():
+                    if body:
+                        return body.pop()
+                    # The client never disconnects; the handler cancels this wait
+                    await asyncio.Future()
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        status.append(message['status'])
+
+                start = time.perf_counter()
+                await application(dict(scope), receive, send)
+                return status[0], time.perf_counter() - start
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(request(semaphore) for _ in range(requests)))
+
+        return asyncio.run(run())
+
+    def summarise(self, deployment, path, outcomes, elapsed, concurrency):
+        timings = [seconds * 1000 for _, seconds in outcomes]
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'deployment': deployment,
+            'path': path,
+            'requests': len(outcomes),
+            'concurrency': concurrency,
+            'errors': sum(1 for status, _ in outcomes if status >= 400),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(outcomes) / elapsed, 1),
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+        }
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from core.models import Customer, Transaction
+from core.references import allocate_references
 from django.utils import timezone
 from django.db import transaction
 
@@ -31,34 +32,32 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.WARNING(f'Customer {customer2.Name} already exists.'))
 
                 # Generate unique references for transactions
-                next_ref_num = Transaction.objects.count() + 1
+                references = iter(allocate_references(3, prefix='INV'))
 
                 Transaction.objects.create(
                     Account=customer1,
                     Date=timezone.now(), # Added Date field
                     Amount=100.00,
                     DC='D',
-                    Reference=f'INV{next_ref_num:07d}' # Added Reference field with unique value
+                    Reference=next(references) # Added Reference field with unique value
                 )
                 self.stdout.write(self.style.SUCCESS(f'Created transaction for {customer1.Name}'))
-                next_ref_num += 1
 
                 Transaction.objects.create(
                     Account=customer1,
                     Date=timezone.now(), # Added Date field
                     Amount=50.00,
                     DC='C',
-                    Reference=f'INV{next_ref_num:07d}' # Added Reference field with unique value
+                    Reference=next(references) # Added Reference field with unique value
                 )
                 self.stdout.write(self.style.SUCCESS(f'Created transaction for {customer1.Name}'))
-                next_ref_num += 1
 
                 Transaction.objects.create(
                     Account=customer2,
                     Date=timezone.now(), # Added Date field
                     Amount=200.00,
                     DC='D',
-                    Reference=f'INV{next_ref_num:07d}' # Added Reference field with unique value
+                    Reference=next(references) # Added Reference field with unique value
                 )
                 self.stdout.write(self.style.SUCCESS('Sample data population complete.'))
         except Exception as e:
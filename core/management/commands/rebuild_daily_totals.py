@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+from core.caching import invalidate_report_caches
+from core.ledger import apply_rollup_deltas
+from core.models import ArchivedTransaction, DailyAccountTotals, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Regenerates the DailyAccountTotals rollup from the live and archived transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Number of rollup rows upserted per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        amount_field = DecimalField(max_digits=14, decimal_places=2)
+
+        def side_total(dc):
+            return Sum(Case(When(DC=dc, then=F('Amount')), default=Value(0), output_field=amount_field))
+
+        with transaction.atomic():
+            DailyAccountTotals.objects.all().delete()
+            # A day can have both live and archived transactions, so the
+            # archive's totals are added to the live ones by upsert
+            for model in (Transaction, ArchivedTransaction):
+                rows = (model.objects
+                        .annotate(day=TruncDate('Date'))
+                        .values('Account_id', 'day')
+                        .annotate(debit=side_total('D'), credit=side_total('C'), count=Count('Number'))
+                        .order_by()
+                        .iterator(chunk_size=batch_size))
+                pending = {}
+                for row in rows:
+                    pending[(row['Account_id'], row['day'])] = (row['debit'], row['credit'], row['count'])
+                    if len(pending) >= batch_size:
+                        apply_rollup_deltas(pending)
+                        pending = {}
+                apply_rollup_deltas(pending)
+            created = DailyAccountTotals.objects.count()
+            invalidate_report_caches()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily account totals.'))
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import REPLICA_DATABASE
+
+
+class Command(BaseCommand):
+    help = ('Copies the primary database onto the read replica with the SQLite backup API, once or every '
+            '--interval seconds. Readers of the replica wait out each copy on their busy timeout.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep running and copy again after this many seconds.')
+        parser.add_argument('--to', dest='target',
+                            help="Copy to this file instead of the replica database's NAME.")
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if target is None:
+            if REPLICA_DATABASE not in connections.settings:
+                raise CommandError(f'No "{REPLICA_DATABASE}" database is configured; set REPLICA_DB_PATH or use --to.')
+            target = connections[REPLICA_DATABASE].settings_dict['NAME']
+        if str(target) == str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']):
+            raise CommandError('The replica is the primary database; nothing to copy.')
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+
+        while True:
+            start = time.perf_counter()
+            pages = self.copy(target)
+            self.stderr.write(f'Copied {pages} pages to {target} in {time.perf_counter() - start:.2f}s.')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, target):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        replica = sqlite3.connect(target)
+        try:
+            # One step copies a consistent snapshot of the primary, holding
+            # the replica's write lock only for the copy itself
+            primary.connection.backup(replica)
+            return replica.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            replica.close()
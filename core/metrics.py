@@ -0,0 +1,135 @@
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds for the request latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds for the per-request query count histogram
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One counter per bucket plus the +Inf bucket; counts are not cumulative
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.responses = {}
+
+
+class MetricsRegistry:
+    """
+    In-process request metrics keyed by URL name.
+
+    Every worker process keeps its own registry, so a scrape of /metrics
+    only reports the process that served it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._cache_results = {}
+        self.lock_retries = 0
+
+    def record(self, view, status, seconds, query_count, sql_seconds):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(query_count)
+            metrics.sql_seconds += sql_seconds
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+    def record_cache(self, cache, hit):
+        key = (cache, 'hit' if hit else 'miss')
+        with self._lock:
+            self._cache_results[key] = self._cache_results.get(key, 0) + 1
+
+    def record_lock_retry(self):
+        with self._lock:
+            self.lock_retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+            self._cache_results = {}
+            self.lock_retries = 0
+
+    def render(self):
+        """Return the registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            views = sorted(self._views.items())
+
+            lines += [
+                '# HELP sales_http_requests_total Requests served, by URL name and status code.',
+                '# TYPE sales_http_requests_total counter',
+            ]
+            for view, metrics in views:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(f'sales_http_requests_total{{view="{_escape(view)}",status="{status}"}} {count}')
+
+            _render_histogram(lines, 'sales_http_request_duration_seconds',
+                              'Request latency in seconds, by URL name.',
+                              [(view, metrics.latency) for view, metrics in views])
+            _render_histogram(lines, 'sales_http_request_queries',
+                              'SQL queries per request, by URL name.',
+                              [(view, metrics.queries) for view, metrics in views])
+
+            lines += [
+                '# HELP sales_http_request_sql_seconds_total Time spent executing SQL, by URL name.',
+                '# TYPE sales_http_request_sql_seconds_total counter',
+            ]
+            for view, metrics in views:
+                lines.append(f'sales_http_request_sql_seconds_total{{view="{_escape(view)}"}} '
+                             f'{metrics.sql_seconds:.6f}')
+
+            lines += [
+                '# HELP sales_cache_requests_total Cache lookups, by cache key and result.',
+                '# TYPE sales_cache_requests_total counter',
+            ]
+            for (cache, result), count in sorted(self._cache_results.items()):
+                lines.append(f'sales_cache_requests_total{{cache="{_escape(cache)}",result="{result}"}} {count}')
+
+            lines += [
+                '# HELP sales_db_lock_retries_total Writes retried because the database was locked.',
+                '# TYPE sales_db_lock_retries_total counter',
+                f'sales_db_lock_retries_total {self.lock_retries}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(lines, name, help_text, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for view, histogram in histograms:
+        label = f'view="{_escape(view)}"'
+        for bound, total in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+        lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
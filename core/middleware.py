@@ -0,0 +1,150 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from core.metrics import registry
+from core.routers import (
+    DEFAULT_REPLICA_PIN_SECONDS, PIN_COOKIE, REPLICA_VIEWS, replica_configured, replica_reads,
+)
+
+logger = logging.getLogger('core.metrics')
+
+DEFAULT_SLOW_REQUEST_MS = 1000
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts queries and their time for a request.
+
+    Unlike connection.queries this works with DEBUG off. The SQL text is kept
+    by reference only so slow requests can be logged with their queries.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            self.queries.append((sql, elapsed))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-URL-name latency, query count and SQL time for every request
+    into core.metrics.registry, and logs requests slower than
+    settings.SLOW_REQUEST_MS with the queries they ran.
+
+    Latency covers the view and response rendering; the body of a streaming
+    response is produced after the middleware returns and is not included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            install_recorder(stack, recorder)
+            response = self.get_response(request)
+        self.record(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        stack = ExitStack()
+        # Connections belong to the thread that runs the request's sync code
+        # (the async ORM included), so install the wrappers from there
+        await sync_to_async(install_recorder)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        view = (match.view_name if match else None) or '<unresolved>'
+        registry.record(view, response.status_code, elapsed, len(recorder.queries), recorder.seconds)
+
+        if elapsed * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+            logger.warning(
+                'Slow request: %s %s (%s) took %.1f ms with %d queries (%.1f ms SQL)\n%s',
+                request.method, request.path, view, elapsed * 1000, len(recorder.queries),
+                recorder.seconds * 1000,
+                '\n'.join(f'  {seconds * 1000:.1f} ms  {sql}' for sql, seconds in recorder.queries),
+            )
+
+
+def install_recorder(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Runs GET and HEAD requests for REPLICA_VIEWS inside replica_reads(),
+    unless the client is pinned to the primary by a recent write of its own.
+    Successful writes set the pin cookie for settings.REPLICA_PIN_SECONDS,
+    which should exceed the replication interval.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.use_replica(request)):
+            response = self.get_response(request)
+        self.pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replica(request)):
+            response = await self.get_response(request)
+        self.pin_after_write(request, response)
+        return response
+
+    def use_replica(self, request):
+        if request.method not in ('GET', 'HEAD') or not replica_configured():
+            return False
+        try:
+            if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+                return False
+        except ValueError:
+            pass
+        try:
+            return resolve(request.path_info).url_name in REPLICA_VIEWS
+        except Resolver404:
+            return False
+
+    def pin_after_write(self, request, response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return
+        seconds = getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_REPLICA_PIN_SECONDS)
+        response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True,
+                            samesite='Lax')
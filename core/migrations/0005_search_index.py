@@ -0,0 +1,98 @@
+from django.db import migrations
+
+# FTS5 trigram indexes over the searchable columns, kept in sync with the base
+# tables by triggers so every write path (forms, bulk_create, update()) is
+# covered. Balance-only updates do not touch the customer index.
+
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_customer_fts USING fts5(
+        "Account", "Name",
+        content='core_customer', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER core_customer_fts_ai AFTER INSERT ON core_customer BEGIN
+        INSERT INTO core_customer_fts(rowid, "Account", "Name")
+        VALUES (new.id, new."Account", new."Name");
+    END
+    """,
+    """
+    CREATE TRIGGER core_customer_fts_ad AFTER DELETE ON core_customer BEGIN
+        INSERT INTO core_customer_fts(core_customer_fts, rowid, "Account", "Name")
+        VALUES ('delete', old.id, old."Account", old."Name");
+    END
+    """,
+    """
+    CREATE TRIGGER core_customer_fts_au AFTER UPDATE OF "Account", "Name" ON core_customer BEGIN
+        INSERT INTO core_customer_fts(core_customer_fts, rowid, "Account", "Name")
+        VALUES ('delete', old.id, old."Account", old."Name");
+        INSERT INTO core_customer_fts(rowid, "Account", "Name")
+        VALUES (new.id, new."Account", new."Name");
+    END
+    """,
+    "INSERT INTO core_customer_fts(core_customer_fts) VALUES ('rebuild')",
+    """
+    CREATE VIRTUAL TABLE core_transaction_fts USING fts5(
+        "Account_id", "Amount", "DC", "Reference",
+        content='core_transaction', content_rowid='Number', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER core_transaction_fts_ai AFTER INSERT ON core_transaction BEGIN
+        INSERT INTO core_transaction_fts(rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES (new."Number", new."Account_id", new."Amount", new."DC", new."Reference");
+    END
+    """,
+    """
+    CREATE TRIGGER core_transaction_fts_ad AFTER DELETE ON core_transaction BEGIN
+        INSERT INTO core_transaction_fts(core_transaction_fts, rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES ('delete', old."Number", old."Account_id", old."Amount", old."DC", old."Reference");
+    END
+    """,
+    """
+    CREATE TRIGGER core_transaction_fts_au AFTER UPDATE ON core_transaction BEGIN
+        INSERT INTO core_transaction_fts(core_transaction_fts, rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES ('delete', old."Number", old."Account_id", old."Amount", old."DC", old."Reference");
+        INSERT INTO core_transaction_fts(rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES (new."Number", new."Account_id", new."Amount", new."DC", new."Reference");
+    END
+    """,
+    "INSERT INTO core_transaction_fts(core_transaction_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS core_transaction_fts_au",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_ad",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_ai",
+    "DROP TABLE IF EXISTS core_transaction_fts",
+    "DROP TRIGGER IF EXISTS core_customer_fts_au",
+    "DROP TRIGGER IF EXISTS core_customer_fts_ad",
+    "DROP TRIGGER IF EXISTS core_customer_fts_ai",
+    "DROP TABLE IF EXISTS core_customer_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_transaction_reference'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerNameKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Key', models.CharField(max_length=4)),
+                ('Customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_keys', to='core.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Key', 'Customer'), name='unique_customer_name_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_customer_name_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Source', models.CharField(max_length=255, unique=True)),
+                ('RowsProcessed', models.PositiveBigIntegerField(default=0)),
+                ('RowsImported', models.PositiveBigIntegerField(default=0)),
+                ('Updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Date', models.DateTimeField()),
+                ('Balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('Account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.customer', to_field='Account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Account', 'Date'), name='unique_balance_checkpoint')],
+            },
+        ),
+    ]
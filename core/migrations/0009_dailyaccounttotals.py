@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAccountTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Day', models.DateField()),
+                ('DebitTotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('CreditTotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('Count', models.IntegerField(default=0)),
+                ('Account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.customer', to_field='Account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Day'], name='daily_totals_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('Account', 'Day'), name='unique_daily_account_totals')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Scope', models.CharField(max_length=40, unique=True)),
+                ('Version', models.PositiveBigIntegerField(default=0)),
+                ('Updated', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ledgerversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Prefix', models.CharField(max_length=9, unique=True)),
+                ('Next', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Trigram index over the archive's searchable columns, as migration 0005 does
+# for core_transaction, so searches reaching back into the archive keep using
+# FTS5. Archived rows are only ever inserted and deleted.
+
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_archivedtransaction_fts USING fts5(
+        "Account_id", "Amount", "DC", "Reference",
+        content='core_archivedtransaction', content_rowid='Number', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER core_archivedtransaction_fts_ai AFTER INSERT ON core_archivedtransaction BEGIN
+        INSERT INTO core_archivedtransaction_fts(rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES (new."Number", new."Account_id", new."Amount", new."DC", new."Reference");
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedtransaction_fts_ad AFTER DELETE ON core_archivedtransaction BEGIN
+        INSERT INTO core_archivedtransaction_fts(core_archivedtransaction_fts, rowid, "Account_id", "Amount", "DC", "Reference")
+        VALUES ('delete', old."Number", old."Account_id", old."Amount", old."DC", old."Reference");
+    END
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS core_archivedtransaction_fts_ad",
+    "DROP TRIGGER IF EXISTS core_archivedtransaction_fts_ai",
+    "DROP TABLE IF EXISTS core_archivedtransaction_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_referencesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('Number', models.IntegerField(primary_key=True, serialize=False)),
+                ('Date', models.DateTimeField()),
+                ('Amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('DC', models.CharField(choices=[('D', 'Debit'), ('C', 'Credit')], max_length=1)),
+                ('Reference', models.CharField(max_length=10, unique=True)),
+                ('Account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.customer', to_field='Account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Account', 'Date'], name='archived_account_date_idx'), models.Index(fields=['Date'], name='archived_date_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:06
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+BATCH_SIZE = 2000
+
+
+def set_opening_balances(apps, schema_editor):
+    # Existing balances have to be taken as correct: the opening balance is
+    # what is left after removing every live and archived transaction. It is
+    # flagged as derived, so reconcile_balances does not count these accounts
+    # as verified against an entered opening balance.
+    Customer = apps.get_model('core', 'Customer')
+    signed = Case(
+        When(DC='D', then=F('Amount')),
+        When(DC='C', then=-F('Amount')),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    totals = defaultdict(Decimal)
+    for name in ('Transaction', 'ArchivedTransaction'):
+        model = apps.get_model('core', name)
+        for account, total in model.objects.values_list('Account_id').annotate(total=Sum(signed)).order_by():
+            totals[account] += total
+
+    customers = list(Customer.objects.only('Account', 'Balance'))
+    for customer in customers:
+        customer.OpeningBalance = customer.Balance - totals[customer.Account]
+        customer.OpeningBalanceDerived = True
+    Customer.objects.bulk_update(customers, ['OpeningBalance', 'OpeningBalanceDerived'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Checked', models.DateTimeField()),
+                ('AccountsChecked', models.PositiveBigIntegerField(default=0)),
+                ('DriftFound', models.PositiveBigIntegerField(default=0)),
+                ('Updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        # Nullable, so SQLite adds the column in place; rebuilding the table
+        # would drop the search index triggers on it
+        migrations.AddField(
+            model_name='customer',
+            name='OpeningBalance',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='OpeningBalanceDerived',
+            field=models.BooleanField(editable=False, null=True),
+        ),
+        migrations.RunPython(set_opening_balances, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import RegexValidator
+from core.phonetics import name_keys
 
 alphanumeric_15_chars = RegexValidator(r'^[0-9a-zA-Z]{15}$', 'Must be exactly 15 alphanumeric characters.')
 alphanumeric_10_chars = RegexValidator(r'^[0-9a-zA-Z]{10}$', 'Must be exactly 10 alphanumeric characters.')
@@ -8,10 +9,54 @@ class Customer(models.Model):
     Account = models.CharField(max_length=15, unique=True, validators=[alphanumeric_15_chars])
     Name = models.CharField(max_length=30)
     Balance = models.DecimalField(max_digits=10, decimal_places=2)
+    # Balance the account was opened with, set by save() on creation.
+    # reconcile_balances checks Balance against it plus every transaction.
+    OpeningBalance = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    # True when OpeningBalance was derived from the balance of an account
+    # that existed before opening balances were recorded, so drift from
+    # before then is built into it; NULL when it was entered. Nullable so
+    # SQLite can add the column without rebuilding the table.
+    OpeningBalanceDerived = models.BooleanField(null=True, editable=False)
 
     def __str__(self):
         return self.Name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get('Name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        name_changed = getattr(self, '_loaded_name', None) != self.Name
+        if self._state.adding and self.OpeningBalance is None:
+            self.OpeningBalance = self.Balance
+        super().save(*args, **kwargs)
+        # Only recompute phonetic keys when the name may have changed
+        if name_changed and (update_fields is None or 'Name' in update_fields):
+            self.update_name_keys()
+            self._loaded_name = self.Name
+
+    def update_name_keys(self):
+        CustomerNameKey.objects.filter(Customer=self).delete()
+        CustomerNameKey.objects.bulk_create(
+            CustomerNameKey(Customer=self, Key=key) for key in name_keys(self.Name)
+        )
+
+class CustomerNameKey(models.Model):
+    Customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='name_keys')
+    Key = models.CharField(max_length=4)
+
+    class Meta:
+        constraints = [
+            # Leading Key column serves the equality lookup in name search
+            models.UniqueConstraint(fields=['Key', 'Customer'], name='unique_customer_name_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.Key} for {self.Customer_id}"
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
         ('D', 'Debit'),
@@ -25,5 +70,126 @@ class Transaction(models.Model):
     DC = models.CharField(max_length=1, choices=TRANSACTION_TYPES)
     Reference = models.CharField(max_length=10, unique=True, validators=[alphanumeric_10_chars], null=False, blank=False)
 
+    is_archived = False
+
+    class Meta:
+        indexes = [
+            # Enquiry details: one account's transactions ordered by date
+            models.Index(fields=['Account', 'Date'], name='transaction_account_date_idx'),
+            # Date range filters and the sortable list columns; each index also
+            # carries Number (the rowid), which serves as the sort tiebreak
+            models.Index(fields=['Date'], name='transaction_date_idx'),
+            models.Index(fields=['Amount'], name='transaction_amount_idx'),
+            models.Index(fields=['DC'], name='transaction_dc_idx'),
+        ]
+
+    def __str__(self):
+        return f"Transaction {self.Number} for {self.Account.Account}"
+
+class ArchivedTransaction(models.Model):
+    """
+    A transaction moved out of Transaction by archive_transactions, keeping
+    its Number. Archived rows still count towards balances and rollups; the
+    list and enquiry views only read them when a date filter reaches back
+    into the archived period (see core.archive).
+    """
+    Number = models.IntegerField(primary_key=True)
+    Account = models.ForeignKey(Customer, to_field='Account', on_delete=models.CASCADE)
+    Date = models.DateTimeField()
+    Amount = models.DecimalField(max_digits=10, decimal_places=2)
+    DC = models.CharField(max_length=1, choices=Transaction.TRANSACTION_TYPES)
+    Reference = models.CharField(max_length=10, unique=True)
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['Account', 'Date'], name='archived_account_date_idx'),
+            models.Index(fields=['Date'], name='archived_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived transaction {self.Number} for {self.Account_id}"
+
+class ImportCheckpoint(models.Model):
+    Source = models.CharField(max_length=255, unique=True)
+    RowsProcessed = models.PositiveBigIntegerField(default=0)
+    RowsImported = models.PositiveBigIntegerField(default=0)
+    Updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.Source} at row {self.RowsProcessed}"
+
+class BalanceReconciliation(models.Model):
+    """
+    Watermark of reconcile_balances: every write stamped (LedgerVersion.Updated)
+    before Checked has been reconciled, so an incremental run only re-checks
+    accounts written since.
+    """
+    Checked = models.DateTimeField()
+    AccountsChecked = models.PositiveBigIntegerField(default=0)
+    DriftFound = models.PositiveBigIntegerField(default=0)
+    Updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Balances reconciled up to {self.Checked}"
+
+class BalanceCheckpoint(models.Model):
+    """Customer balance including every transaction dated at or before Date."""
+    Account = models.ForeignKey(Customer, to_field='Account', on_delete=models.CASCADE)
+    Date = models.DateTimeField()
+    Balance = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Also the index for nearest-checkpoint lookups per account
+            models.UniqueConstraint(fields=['Account', 'Date'], name='unique_balance_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.Account_id} balance {self.Balance} at {self.Date}"
+
+class DailyAccountTotals(models.Model):
+    """Per account, per day rollup of transactions, maintained by core.ledger."""
+    Account = models.ForeignKey(Customer, to_field='Account', on_delete=models.CASCADE)
+    Day = models.DateField()
+    DebitTotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    CreditTotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    Count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['Account', 'Day'], name='unique_daily_account_totals'),
+        ]
+        indexes = [
+            # Period totals across all accounts scan by day
+            models.Index(fields=['Day'], name='daily_totals_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.Account_id} totals for {self.Day}"
+
+class LedgerVersion(models.Model):
+    """
+    Write counter for a scope of the ledger ('customers', 'transactions' or
+    'account:<Account>'), bumped by every write that changes what the list
+    and enquiry pages show. Used to answer conditional GETs cheaply.
+    """
+    Scope = models.CharField(max_length=40, unique=True)
+    Version = models.PositiveBigIntegerField(default=0)
+    Updated = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.Scope} version {self.Version}"
+
+class ReferenceSequence(models.Model):
+    """
+    Next unused number for generated references starting with Prefix. Blocks
+    of numbers are reserved from it by core.references, so processes and
+    threads can hand out references without a query per row.
+    """
+    Prefix = models.CharField(max_length=9, unique=True)
+    Next = models.PositiveBigIntegerField(default=0)
+
     def __str__(self):
-        return f"Transaction {self.Number} for {self.Account.Account}"
\ No newline at end of file
+        return f"{self.Prefix} next {self.Next}"
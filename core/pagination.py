@@ -0,0 +1,207 @@
+import base64
+import json
+from functools import cmp_to_key
+from itertools import chain
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, expected_length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor.')
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise InvalidCursor('Cursor does not match the current sort order.')
+    return values
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def _field_value(obj, field):
+    # Follow lookups such as 'Account__Account' through related objects
+    value = obj
+    for part in field.split('__'):
+        value = getattr(value, part)
+    return value
+
+
+def _row_value(obj, field):
+    value = _field_value(obj, field)
+    if isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _keyset_q(ordering, values, reverse=False):
+    """
+    Build the row-value comparison "(f1, f2, ...) > (v1, v2, ...)" for a mixed
+    direction ordering as an OR of prefix-equality clauses.
+
+    The OR is ANDed with a plain range bound on the first field, which is
+    implied by it but lets the database seek into an index on that field.
+    """
+    keyset_q = Q()
+    equal_prefix = Q()
+    for (field, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        keyset_q |= equal_prefix & Q(**{f'{field}__{lookup}': value})
+        equal_prefix &= Q(**{field: value})
+
+    (first_field, first_descending), first_value = ordering[0], values[0]
+    bound = 'lte' if first_descending != reverse else 'gte'
+    return Q(**{f'{first_field}__{bound}': first_value}) & keyset_q
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def _cursor_for(self, obj):
+        return encode_cursor([_row_value(obj, field) for field, _ in self.ordering])
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor_for(self.object_list[0])
+        return None
+
+
+def build_ordering(sort_fields, sort_orders, tiebreak):
+    """
+    Turn the parallel sort_by/order lists into [(field, descending), ...] and
+    append the unique tiebreak column so every row has a total position.
+
+    The tiebreak runs in the same direction as the last sort field, so a
+    single column sort can be read straight off an index on that column
+    (SQLite indexes end with the rowid) without a sort step.
+    """
+    ordering = []
+    for field, order in zip(sort_fields, sort_orders):
+        if field not in [f for f, _ in ordering]:
+            ordering.append((field, order == 'desc'))
+    if tiebreak not in [f for f, _ in ordering]:
+        ordering.append((tiebreak, ordering[-1][1] if ordering else False))
+    return ordering
+
+
+def _keyset_queryset(queryset, ordering, after, before):
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+
+    order_by = []
+    for field, descending in ordering:
+        descending = descending != backwards
+        order_by.append(f'-{field}' if descending else field)
+    queryset = queryset.order_by(*order_by)
+
+    if cursor:
+        values = decode_cursor(cursor, len(ordering))
+        queryset = queryset.filter(_keyset_q(ordering, values, reverse=backwards))
+    return queryset, backwards, cursor
+
+
+def _keyset_page(rows, ordering, page_size, backwards, cursor):
+    # One extra row was fetched to learn whether another page exists
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if backwards:
+        rows.reverse()
+        return KeysetPage(rows, ordering, has_next=True, has_previous=has_more)
+    return KeysetPage(rows, ordering, has_next=has_more, has_previous=bool(cursor))
+
+
+def keyset_paginate(queryset, ordering, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return a single page of ``queryset`` positioned after (or before) a cursor.
+
+    The cost of each page is a bounded index range read regardless of how deep
+    the page is, unlike OFFSET pagination which has to walk every skipped row.
+    Raises InvalidCursor if the cursor cannot be decoded for this ordering.
+    """
+    queryset, backwards, cursor = _keyset_queryset(queryset, ordering, after, before)
+    rows = list(queryset[:page_size + 1])
+    return _keyset_page(rows, ordering, page_size, backwards, cursor)
+
+
+async def akeyset_paginate(queryset, ordering, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """Async version of keyset_paginate(), fetching the page with the async ORM."""
+    queryset, backwards, cursor = _keyset_queryset(queryset, ordering, after, before)
+    rows = [row async for row in queryset[:page_size + 1]]
+    return _keyset_page(rows, ordering, page_size, backwards, cursor)
+
+
+def _merge_rows(row_lists, ordering, backwards):
+    """Merge rows read from several querysets in the order they were fetched."""
+    def compare(a, b):
+        for field, descending in ordering:
+            x, y = _field_value(a, field), _field_value(b, field)
+            if x != y:
+                return (1 if x > y else -1) * (-1 if descending != backwards else 1)
+        return 0
+    return sorted(chain.from_iterable(row_lists), key=cmp_to_key(compare))
+
+
+def keyset_paginate_many(querysets, ordering, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    keyset_paginate() over the combined rows of several querysets with the
+    same sort fields, such as live and archived transactions. Each queryset
+    is read with its own bounded range and the results are merged, so a page
+    costs one query per queryset. The tiebreak must be unique across them.
+    """
+    row_lists = []
+    for queryset in querysets:
+        queryset, backwards, cursor = _keyset_queryset(queryset, ordering, after, before)
+        row_lists.append(list(queryset[:page_size + 1]))
+    rows = _merge_rows(row_lists, ordering, backwards)[:page_size + 1]
+    return _keyset_page(rows, ordering, page_size, backwards, cursor)
+
+
+async def akeyset_paginate_many(querysets, ordering, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """Async version of keyset_paginate_many()."""
+    row_lists = []
+    for queryset in querysets:
+        queryset, backwards, cursor = _keyset_queryset(queryset, ordering, after, before)
+        row_lists.append([row async for row in queryset[:page_size + 1]])
+    rows = _merge_rows(row_lists, ordering, backwards)[:page_size + 1]
+    return _keyset_page(rows, ordering, page_size, backwards, cursor)
@@ -0,0 +1,32 @@
+import re
+
+SOUNDEX_CODES = {}
+for letters, code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'), ('L', '4'), ('MN', '5'), ('R', '6')):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = code
+
+
+def soundex(word):
+    """
+    American Soundex code for a single word, e.g. 'Smith' and 'Smyth' both give
+    'S530'. Returns an empty string if the word has no ASCII letters.
+    """
+    letters = re.sub(r'[^A-Z]', '', word.upper())
+    if not letters:
+        return ''
+
+    key = letters[0]
+    last_code = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        code = SOUNDEX_CODES.get(letter, '')
+        if code and code != last_code:
+            key += code
+        # H and W do not separate letters with the same code; vowels do
+        if letter not in 'HW':
+            last_code = code
+    return (key + '000')[:4]
+
+
+def name_keys(name):
+    """Return the set of phonetic keys for each word in a name."""
+    return {key for key in (soundex(word) for word in name.split()) if key}
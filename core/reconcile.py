@@ -0,0 +1,172 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.database import retry_on_lock
+from core.ledger import apply_balance_deltas, signed_amount_expression
+from core.models import (
+    ArchivedTransaction, BalanceCheckpoint, BalanceReconciliation, Customer, LedgerVersion, Transaction,
+)
+from core.versions import CUSTOMERS, account_scope, bump_versions
+
+DEFAULT_RANGE_SIZE = 10000
+CENT = Decimal('0.01')
+
+
+class AccountRange:
+    """
+    A slice of the customers to reconcile: the accounts from ``first`` up to
+    (not including) ``end``, either bound open when None, or an explicit list
+    of ``accounts``.
+    """
+
+    def __init__(self, first=None, end=None, accounts=None):
+        self.first = first
+        self.end = end
+        self.accounts = accounts
+
+    def filter(self, queryset, field):
+        if self.accounts is not None:
+            return queryset.filter(**{f'{field}__in': self.accounts})
+        if self.first is not None:
+            queryset = queryset.filter(**{f'{field}__gte': self.first})
+        if self.end is not None:
+            queryset = queryset.filter(**{f'{field}__lt': self.end})
+        return queryset
+
+
+def account_ranges(size=DEFAULT_RANGE_SIZE):
+    """
+    Split all customers into ranges of ``size`` accounts. Each boundary is
+    found by skipping ``size`` entries of the Account index from the last one,
+    so the whole split reads the index once.
+    """
+    accounts = Customer.objects.order_by('Account').values_list('Account', flat=True)
+    ranges = []
+    first = None
+    while True:
+        rest = accounts if first is None else accounts.filter(Account__gte=first)
+        end = next(iter(rest[size:size + 1]), None)
+        ranges.append(AccountRange(first, end))
+        if end is None:
+            return ranges
+        first = end
+
+
+def touched_ranges(since, size=DEFAULT_RANGE_SIZE):
+    """Ranges of ``size`` accounts covering every account written at or after ``since``."""
+    prefix = account_scope('')
+    scopes = (LedgerVersion.objects.filter(Scope__startswith=prefix, Updated__gte=since)
+              .order_by('Scope').values_list('Scope', flat=True))
+    accounts = [scope[len(prefix):] for scope in scopes.iterator()]
+    return [AccountRange(accounts=accounts[start:start + size]) for start in range(0, len(accounts), size)]
+
+
+class _SortedTotals:
+    """Per account totals from a query ordered by account, consumed in step with the customers."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.current = next(self.rows, None)
+
+    def pop(self, account):
+        total = Decimal('0')
+        while self.current is not None and self.current[0] <= account:
+            if self.current[0] == account:
+                total = self.current[1] or Decimal('0')
+            self.current = next(self.rows, None)
+        return total
+
+
+def check_range(account_range, using=DEFAULT_DB_ALIAS):
+    """
+    Compare Customer.Balance in ``account_range`` with the opening balance
+    plus the live and archived transactions. The customers and the two grouped
+    sums are streamed in account order and merged, so memory does not grow
+    with the range. Returns (accounts checked, of which checked against a
+    derived opening balance, [(account, balance, expected)]).
+    """
+    def totals(model):
+        return _SortedTotals(
+            account_range.filter(model.objects.using(using), 'Account_id').values_list('Account_id')
+            .annotate(total=Sum(signed_amount_expression())).order_by('Account_id').iterator())
+
+    customers = (account_range.filter(Customer.objects.using(using), 'Account').order_by('Account')
+                 .values_list('Account', 'Balance', 'OpeningBalance', 'OpeningBalanceDerived').iterator())
+    live, archived = totals(Transaction), totals(ArchivedTransaction)
+    checked = derived = 0
+    drift = []
+    for account, balance, opening, opening_derived in customers:
+        expected = ((opening or Decimal('0')) + live.pop(account) + archived.pop(account)).quantize(CENT)
+        if balance != expected:
+            drift.append((account, balance, expected))
+        checked += 1
+        derived += bool(opening_derived)
+    return checked, derived, drift
+
+
+def check_ranges(ranges, workers, using=DEFAULT_DB_ALIAS):
+    """
+    Run check_range() over ``ranges`` in a pool of ``workers`` processes and
+    return the combined (accounts checked, derived opening balances, drift).
+
+    Workers are forked, so they start with the configured app registry; the
+    parent's connections are closed first so no SQLite handle crosses the
+    fork. An in-memory database cannot be shared with other processes, so it
+    is checked in this process.
+    """
+    connection = connections[using]
+    check = partial(check_range, using=using)
+    if workers > 1 and len(ranges) > 1 and not (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(check, ranges))
+    else:
+        results = [check(account_range) for account_range in ranges]
+    return (sum(checked for checked, _, _ in results), sum(derived for _, derived, _ in results),
+            [row for _, _, drift in results for row in drift])
+
+
+@retry_on_lock
+def confirm_drift(accounts, repair=False):
+    """
+    Check ``accounts`` again inside one write transaction, so no posting can
+    land between reading a balance and its transactions, and return the drift
+    that is really there. With ``repair`` each balance is moved by its drift
+    in the same transaction and the account's balance checkpoints, which were
+    derived from the wrong balance, are dropped.
+    """
+    with db_transaction.atomic():
+        _, _, drift = check_range(AccountRange(accounts=accounts))
+        if repair and drift:
+            drifted = [account for account, _, _ in drift]
+            apply_balance_deltas({account: expected - balance for account, balance, expected in drift})
+            BalanceCheckpoint.objects.filter(Account__in=drifted).delete()
+            bump_versions([CUSTOMERS, *map(account_scope, drifted)])
+    return drift
+
+
+def start_watermark():
+    """
+    Timestamp for the next incremental run, taken while holding the write
+    lock: writes stamped before it have committed, later ones are stamped
+    after it.
+    """
+    with db_transaction.atomic():
+        return timezone.now()
+
+
+def last_watermark():
+    reconciliation = BalanceReconciliation.objects.order_by('-Checked').first()
+    return reconciliation.Checked if reconciliation else None
+
+
+def save_watermark(checked, accounts_checked, drift_found):
+    BalanceReconciliation.objects.update_or_create(pk=1, defaults={
+        'Checked': checked, 'AccountsChecked': accounts_checked, 'DriftFound': drift_found,
+    })
@@ -0,0 +1,143 @@
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+
+from core.models import ArchivedTransaction, ReferenceSequence, Transaction
+
+REFERENCE_LENGTH = 10
+DEFAULT_PREFIX = 'R'
+DEFAULT_BLOCK_SIZE = 1000
+
+_local = threading.local()
+
+
+def _first_free_number(prefix):
+    """One past the highest live or archived reference made of ``prefix`` and digits."""
+    width = REFERENCE_LENGTH - len(prefix)
+    # The range keeps the lookup on the Reference index; the regex skips
+    # references in it whose tail is not a number
+    last = max((
+        model.objects
+        .filter(Reference__range=(prefix + '0' * width, prefix + '9' * width),
+                Reference__regex=rf'^{prefix}[0-9]{{{width}}}$')
+        .order_by('-Reference').values_list('Reference', flat=True).first() or ''
+        for model in (Transaction, ArchivedTransaction)
+    ))
+    return int(last[len(prefix):]) + 1 if last else 1
+
+
+def default_prefix():
+    return getattr(settings, 'REFERENCE_PREFIX', DEFAULT_PREFIX)
+
+
+def is_generated_reference(reference, prefix=None):
+    """
+    Whether ``reference`` has the form of one generated for ``prefix``
+    (default settings.REFERENCE_PREFIX). Stored references are only checked
+    when a sequence is created, so clients may not supply these.
+    """
+    prefix = prefix or default_prefix()
+    tail = reference[len(prefix):]
+    return (len(reference) == REFERENCE_LENGTH and reference.startswith(prefix)
+            and tail.isascii() and tail.isdigit())
+
+
+def reserve_block(prefix, size):
+    """
+    Reserve ``size`` consecutive numbers for ``prefix`` with one UPDATE ...
+    RETURNING on its ReferenceSequence row and return (first, end). The
+    sequence is created on first use, starting after any reference with the
+    same prefix that is already stored.
+    """
+    table = ReferenceSequence._meta.db_table
+    # Each statement is atomic on its own; when two processes create the
+    # sequence at once, the second insert becomes an increment
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET "Next" = "Next" + %s WHERE "Prefix" = %s RETURNING "Next"',
+            [size, prefix]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                f'INSERT INTO {table} ("Prefix", "Next") VALUES (%s, %s) '
+                f'ON CONFLICT ("Prefix") DO UPDATE SET "Next" = {table}."Next" + %s RETURNING "Next"',
+                [prefix, _first_free_number(prefix) + size, size]
+            )
+            row = cursor.fetchone()
+    end = row[0]
+    if end > 10 ** (REFERENCE_LENGTH - len(prefix)):
+        raise OverflowError(f'No generated references left for prefix "{prefix}".')
+    return end - size, end
+
+
+class _Reservation:
+    """on_commit callback recording that the transaction holding a reservation committed."""
+
+    def __init__(self):
+        self.committed = False
+
+    def __call__(self):
+        self.committed = True
+
+    def is_durable(self):
+        # Django drops pending on_commit callbacks when their transaction or
+        # savepoint rolls back, taking the reservation with it
+        return self.committed or any(func is self for _, func, _ in connection.run_on_commit)
+
+
+class ReferenceAllocator:
+    """
+    Hands out unique references ``<prefix><zero-padded number>`` from blocks
+    reserved in the database, so only one query is needed per block.
+
+    Numbers are never handed out twice, but unused ones are skipped when a
+    process exits or a reservation is rolled back, so references have gaps.
+    Each thread gets its own allocator from get_allocator(), because a block
+    reserved inside a transaction is only safe to use from that connection.
+    """
+
+    def __init__(self, prefix, block_size):
+        if not prefix.isalpha() or len(prefix) >= REFERENCE_LENGTH:
+            raise ValueError('Reference prefixes must be letters only and shorter than a reference.')
+        self.prefix = prefix
+        self.block_size = block_size
+        self.next = self.end = 0
+        self.reservation = None
+
+    def allocate(self, count=1):
+        """Return ``count`` new references."""
+        references = []
+        while len(references) < count:
+            if self.reservation and not self.reservation.is_durable():
+                self.next = self.end = 0
+            if self.next == self.end:
+                self.next, self.end = reserve_block(self.prefix, max(self.block_size, count - len(references)))
+                self.reservation = _Reservation()
+                db_transaction.on_commit(self.reservation)
+            take = min(count - len(references), self.end - self.next)
+            width = REFERENCE_LENGTH - len(self.prefix)
+            references.extend(f'{self.prefix}{n:0{width}d}' for n in range(self.next, self.next + take))
+            self.next += take
+        return references
+
+
+def get_allocator(prefix=None):
+    """This thread's allocator for ``prefix`` (default settings.REFERENCE_PREFIX)."""
+    prefix = prefix or default_prefix()
+    allocators = _local.__dict__.setdefault('allocators', {})
+    if prefix not in allocators:
+        allocators[prefix] = ReferenceAllocator(
+            prefix, getattr(settings, 'REFERENCE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+    return allocators[prefix]
+
+
+def allocate_references(count, prefix=None):
+    """Return ``count`` new unique references."""
+    return get_allocator(prefix).allocate(count)
+
+
+def next_reference(prefix=None):
+    """Return one new unique reference."""
+    return get_allocator(prefix).allocate(1)[0]
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DATABASE = 'replica'
+
+# Read-only views whose queries may be answered by the replica
+REPLICA_VIEWS = {
+    'customer_list', 'transaction_list',
+    'enquiry_customer_list', 'enquiry_transaction_details', 'enquiry_balance_at',
+}
+
+# Set on responses to writes; while it is valid the client reads from the
+# primary, so it sees its own writes before the replica catches up
+PIN_COOKIE = 'primary_reads_until'
+DEFAULT_REPLICA_PIN_SECONDS = 60
+
+# A copy older than this is not read from
+DEFAULT_REPLICA_MAX_LAG_SECONDS = 60
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    """
+    True when a replica separate from the primary is configured and ready to
+    read: its file holds every core table and was copied within
+    REPLICA_MAX_LAG_SECONDS. Test runs mirror it onto the primary.
+    """
+    if REPLICA_DATABASE not in connections.settings:
+        return False
+    name = str(connections.settings[REPLICA_DATABASE]['NAME'])
+    if name == str(connections.settings[DEFAULT_DB_ALIAS]['NAME']):
+        return False
+    try:
+        stat = os.stat(name)
+    except OSError:
+        return False
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', DEFAULT_REPLICA_MAX_LAG_SECONDS)
+    if time.time() - stat.st_mtime > max_lag:
+        return False
+    return _replica_migrated(name, stat)
+
+
+# (file, mtime, size) of the copy last inspected, and whether it was migrated
+_inspected = [None, False]
+
+
+def _replica_migrated(name, stat):
+    """
+    Whether the copy at ``name`` holds a table for every core model. Checked
+    once per copy, on a read-only handle so a missing file is never created.
+    """
+    copy = (name, stat.st_mtime_ns, stat.st_size)
+    if _inspected[0] != copy:
+        migrated = False
+        if stat.st_size:
+            try:
+                replica = sqlite3.connect(f'{Path(name).resolve().as_uri()}?mode=ro', uri=True)
+                try:
+                    tables = {row[0] for row in replica.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                finally:
+                    replica.close()
+                migrated = {model._meta.db_table for model in apps.get_app_config('core').get_models()} <= tables
+            except sqlite3.Error:
+                pass
+        _inspected[:] = [copy, migrated]
+    return _inspected[1]
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route reads of core models to the replica (or, with enabled=False, to the primary) in this block."""
+    token = _use_replica.set(enabled and replica_configured())
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def primary_reads():
+    return replica_reads(enabled=False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of the core app's models to the replica inside
+    replica_reads(), and everything else (writes, sessions, auth,
+    migrations) to the primary. The replica is a copy of the primary kept up
+    to date by the replicate_db command, so it is never migrated itself.
+    Installed only when settings.REPLICA_DB_PATH is set.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'core' and _use_replica.get():
+            return REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA_DATABASE
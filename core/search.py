@@ -0,0 +1,102 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from core.models import CustomerNameKey
+from core.phonetics import soundex
+
+# FTS5 trigram indexes created by migrations 0005 and 0013. Tokens shorter than the
+# trigram width cannot be answered by the index and fall back to LIKE.
+FTS_TABLES = {
+    'core_customer': 'core_customer_fts',
+    'core_transaction': 'core_transaction_fts',
+    'core_archivedtransaction': 'core_archivedtransaction_fts',
+}
+MIN_INDEXED_TERM_LENGTH = 3
+
+
+def get_fuzzy_q_objects(term, fields):
+    q_objects = Q()
+    for field in fields:
+        q_objects |= Q(**{f'{field}__icontains': term})
+    return q_objects
+
+
+def get_phonetic_q_objects(term):
+    """Match customers with a name word that sounds like ``term``."""
+    key = soundex(term)
+    if not key:
+        return Q(pk__in=[])
+    return Q(pk__in=CustomerNameKey.objects.filter(Key=key).values('Customer'))
+
+
+def search_index_available():
+    return connection.vendor == 'sqlite'
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_expression(terms):
+    """Build an FTS5 MATCH string that ANDs the terms together."""
+    return ' AND '.join(_quote(term) for term in terms)
+
+
+def _match_q(fts_table, match):
+    return Q(pk__in=RawSQL(
+        f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match]
+    ))
+
+
+def apply_search(queryset, query, fields, phonetic=False):
+    """
+    Filter ``queryset`` so every whitespace separated term in ``query`` matches
+    at least one of ``fields``, or with ``phonetic`` sounds like a word of the
+    customer's name.
+
+    Terms long enough for the trigram index are answered by FTS5 lookups; the
+    rest use the icontains fallback. Phonetic matches are an indexed equality
+    lookup on CustomerNameKey. Returns the filtered queryset and the MATCH
+    expression used (None when the index was not used), which can be passed to
+    annotate_rank.
+    """
+    terms = query.split()
+    if search_index_available():
+        indexed = [t for t in terms if len(t) >= MIN_INDEXED_TERM_LENGTH]
+    else:
+        indexed = []
+    fts_table = FTS_TABLES[queryset.model._meta.db_table]
+
+    if not phonetic:
+        for term in terms:
+            if term not in indexed:
+                queryset = queryset.filter(get_fuzzy_q_objects(term, fields))
+        if not indexed:
+            return queryset, None
+        match = build_match_expression(indexed)
+        return queryset.filter(_match_q(fts_table, match)), match
+
+    # Each term may match either textually or phonetically, so the terms
+    # cannot share a single MATCH expression
+    for term in terms:
+        if term in indexed:
+            term_q = _match_q(fts_table, build_match_expression([term]))
+        else:
+            term_q = get_fuzzy_q_objects(term, fields)
+        queryset = queryset.filter(term_q | get_phonetic_q_objects(term))
+    return queryset, build_match_expression(indexed) if indexed else None
+
+
+def annotate_rank(queryset, match):
+    """
+    Annotate ``search_rank`` (bm25, lower is better) for a MATCH expression.
+    Rows that did not match the expression get NULL.
+    """
+    opts = queryset.model._meta
+    fts_table = FTS_TABLES[opts.db_table]
+    return queryset.annotate(search_rank=RawSQL(
+        f'SELECT rank FROM {fts_table} WHERE {fts_table} MATCH %s '
+        f'AND rowid = "{opts.db_table}"."{opts.pk.column}"',
+        [match]
+    ))
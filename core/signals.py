@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.caching import invalidate_customer_caches
+from core.models import Customer
+from core.versions import CUSTOMERS, TRANSACTIONS, account_scope, bump_versions
+
+
+# Balance changes from transaction writes are applied with queryset updates
+# in core.ledger, which does its own invalidation
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    invalidate_customer_caches()
+    # The transaction list shows customer names, and a delete cascades to
+    # the customer's transactions
+    bump_versions([CUSTOMERS, TRANSACTIONS, account_scope(instance.Account)])
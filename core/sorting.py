@@ -0,0 +1,70 @@
+from django.contrib import messages
+
+ARROWS = {'asc': '▲', 'desc': '▼'}
+
+# Query parameters that only make sense for the current sort order
+ORDER_DEPENDENT_PARAMS = ('sort_by', 'order', 'after', 'before')
+
+
+class SortHeader:
+    """Everything a list template needs to print one sortable column header."""
+
+    def __init__(self, label, url, direction=None, priority=None):
+        self.label = label
+        self.url = url
+        self.direction = direction
+        self.priority = priority
+
+    @property
+    def arrow(self):
+        return ARROWS.get(self.direction, '')
+
+
+def parse_sort(request, columns):
+    """
+    Read the parallel sort_by/order query lists, keeping only fields listed
+    in ``columns`` ({field: label}). Unknown fields are reported with a
+    message and dropped here, before they can reach order_by(); repeated
+    fields keep their first position and a missing or unknown order means
+    ascending. Returns (sort_fields, sort_orders).
+    """
+    orders = request.GET.getlist('order')
+    sort_fields, sort_orders = [], []
+    for index, field in enumerate(request.GET.getlist('sort_by')):
+        if field not in columns:
+            messages.error(request, f'Cannot sort by "{field}".')
+        elif field not in sort_fields:
+            order = orders[index] if index < len(orders) else 'asc'
+            sort_fields.append(field)
+            sort_orders.append('desc' if order == 'desc' else 'asc')
+    return sort_fields, sort_orders
+
+
+def sort_headers(request, base_url, columns, sort_fields, sort_orders):
+    """
+    Build a SortHeader per column. Clicking a column makes it the primary sort
+    (toggling its direction if it already is) and keeps the other sort keys
+    after it; search and filter parameters are carried over, cursors are not.
+    """
+    params = request.GET.copy()
+    for param in ORDER_DEPENDENT_PARAMS:
+        params.pop(param, None)
+
+    current = dict(zip(sort_fields, sort_orders))
+    show_priority = len(sort_fields) > 1
+    headers = []
+    for field, label in columns.items():
+        primary = bool(sort_fields) and sort_fields[0] == field
+        direction = 'desc' if primary and sort_orders[0] == 'asc' else 'asc'
+        rest = [(f, o) for f, o in zip(sort_fields, sort_orders) if f != field]
+
+        query = params.copy()
+        query.setlist('sort_by', [field] + [f for f, _ in rest])
+        query.setlist('order', [direction] + [o for _, o in rest])
+        headers.append(SortHeader(
+            label,
+            f'{base_url}?{query.urlencode()}',
+            direction=current.get(field),
+            priority=sort_fields.index(field) + 1 if field in current and show_priority else None,
+        ))
+    return headers
@@ -4,4 +4,5 @@ register = template.Library()
 
 @register.filter
 def zip_lists(a, b):
-    return zip(a, b)
\ No newline at end of file
+    # A list, so the result can be looped over more than once
+    return list(zip(a, b))
\ No newline at end of file
@@ -1,9 +1,36 @@
-from django.test import TestCase
-from core.models import Customer, Transaction
+from django.test import TestCase, TransactionTestCase
+from core.models import BalanceReconciliation, Customer, CustomerNameKey, DailyAccountTotals, Transaction
+from core.urls import urlpatterns
+from django.db.models import F, Sum
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from core.forms import TransactionForm
+from core.phonetics import soundex
+from core.validation import validate_transaction_batch
+from core.references import ReferenceAllocator, allocate_references
+from core.database import retry_on_lock
+from core.ledger import post_transactions
+from core.middleware import ReplicaRoutingMiddleware
+from core.routers import PIN_COOKIE, REPLICA_DATABASE, ReplicaRouter
+from core.reconcile import account_ranges, check_ranges
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+import sqlite3
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.urls import reverse
+import threading
+import time
+from core.management.commands import import_transactions
+from django.core.management import call_command
+from io import StringIO
+from unittest.mock import patch
+import json
+import os
+import tempfile
 
 class CustomerModelTest(TestCase):
 
@@ -144,3 +171,532 @@ class TransactionModelTest(TestCase):
         )
         self.assertEqual(transaction_debit.get_DC_display(), 'Debit')
         self.assertEqual(transaction_credit.get_DC_display(), 'Credit')
+
+class PhoneticKeyTest(TestCase):
+
+    def test_soundex_groups_spelling_variants(self):
+        self.assertEqual(soundex('Alice'), soundex('Alyce'))
+        self.assertEqual(soundex('Alice'), soundex('Alis'))
+        self.assertEqual(soundex('Smith'), 'S530')
+        self.assertEqual(soundex('Smyth'), 'S530')
+        self.assertEqual(soundex('Pfister'), 'P236')
+        self.assertEqual(soundex('12345'), '')
+
+    def test_name_keys_follow_customer_name(self):
+        customer = Customer.objects.create(Account='CUSTKEYS0000001', Name='Alice Smith', Balance=Decimal('0.00'))
+        self.assertEqual(set(customer.name_keys.values_list('Key', flat=True)), {'A420', 'S530'})
+
+        customer.Name = 'Bob Smith'
+        customer.save()
+        self.assertEqual(set(customer.name_keys.values_list('Key', flat=True)), {'B100', 'S530'})
+
+    def test_balance_save_keeps_name_keys(self):
+        Customer.objects.create(Account='CUSTKEYS0000002', Name='Alice', Balance=Decimal('0.00'))
+        customer = Customer.objects.get(Account='CUSTKEYS0000002')
+        key_pk = customer.name_keys.get().pk
+        customer.Balance = Decimal('10.00')
+        customer.save()
+        self.assertEqual(customer.name_keys.get().pk, key_pk)
+
+class ImportTransactionsCommandTest(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(Account='CUSTIMPORT00001', Name='Importer', Balance=Decimal('100.00'))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', newline='') as f:
+            f.write(content)
+        return path
+
+    def test_csv_import_adjusts_balance_and_skips_invalid_rows(self):
+        path = self._write('batch.csv', (
+            'Account,Date,Amount,DC,Reference\n'
+            'CUSTIMPORT00001,2025-08-11T12:00:00,10.00,D,IMPCSV0001\n'
+            'CUSTIMPORT00001,2025-08-11T12:00:00,2.50,C,IMPCSV0002\n'
+            'UNKNOWN00000000,2025-08-11T12:00:00,2.50,C,IMPCSV0003\n'
+            'CUSTIMPORT00001,not-a-date,2.50,C,IMPCSV0004\n'
+            'CUSTIMPORT00001,2025-08-11T12:00:00,1.00,D,IMPCSV0001\n'
+        ))
+        err = StringIO()
+        call_command('import_transactions', path, chunk_size=2, stdout=StringIO(), stderr=err)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.Balance, Decimal('107.50'))
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertIn('Unknown account', err.getvalue())
+        self.assertIn('Invalid date', err.getvalue())
+        self.assertIn('Duplicate reference', err.getvalue())
+
+    def test_killed_ndjson_import_resumes_without_double_posting(self):
+        lines = [
+            json.dumps({'Account': 'CUSTIMPORT00001', 'Date': '2025-08-11T12:00:00', 'Amount': '1.00',
+                        'DC': 'D', 'Reference': f'IMPJSN{i:04d}'})
+            for i in range(5)
+        ]
+        path = self._write('batch.ndjson', '\n'.join(lines) + '\n')
+
+        real_post = import_transactions.post_transactions
+        calls = []
+
+        def failing_post(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('killed')
+            return real_post(rows)
+
+        with patch.object(import_transactions, 'post_transactions', failing_post):
+            with self.assertRaises(RuntimeError):
+                call_command('import_transactions', path, chunk_size=2, stdout=StringIO())
+        self.assertEqual(Transaction.objects.count(), 2)
+
+        call_command('import_transactions', path, chunk_size=2, stdout=StringIO())
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.Balance, Decimal('105.00'))
+
+class GenerateDataCommandTest(TestCase):
+
+    def test_generates_requested_rows_and_reruns_append(self):
+        call_command('generate_data', customers=5, transactions=300, batch_size=100, seed=7, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertTrue(CustomerNameKey.objects.exists())
+
+        # A second run continues the numbering instead of colliding
+        call_command('generate_data', customers=5, transactions=300, batch_size=100, seed=7, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertEqual(Transaction.objects.count(), 600)
+        self.assertEqual(DailyAccountTotals.objects.aggregate(n=Sum('Count'))['n'], 600)
+
+
+class BenchmarkViewsCommandTest(TestCase):
+
+    def test_reports_every_url(self):
+        call_command('generate_data', customers=3, transactions=50, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_views', requests=2, bulk_rows=5, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        names = {scenario['name'] for scenario in report['scenarios']}
+        self.assertTrue({pattern.name for pattern in urlpatterns} <= names)
+        for scenario in report['scenarios']:
+            self.assertLess(scenario['status'], 400, scenario['name'])
+        # The bulk post was rolled back
+        self.assertEqual(Transaction.objects.count(), 50)
+
+
+class LoadTestCommandTest(TransactionTestCase):
+    # The WSGI requests run on worker threads with their own connections, so
+    # the data has to be committed for them to see it
+
+    def test_reports_both_deployments_for_every_path(self):
+        call_command('generate_data', customers=3, transactions=20, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('load_test', requests=4, concurrency=2, host='testserver', stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())['results']
+        self.assertEqual({result['deployment'] for result in results}, {'wsgi', 'asgi'})
+        self.assertEqual(len(results), 8)
+        for result in results:
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0, result['path'])
+
+
+class BatchValidationTest(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(Account='CUSTVALIDATE001', Name='Validator', Balance=Decimal('0.00'))
+        Transaction.objects.create(Account=customer, Date=timezone.now(), Amount=Decimal('1.00'), DC='D',
+                                   Reference='USEDREF001')
+
+    def test_reports_every_problem_with_two_queries(self):
+        rows = [
+            {'Account': 'CUSTVALIDATE001', 'Reference': 'FRESHREF01'},
+            {'Account': 'CUSTVALIDATE001', 'Reference': 'USEDREF001'},
+            {'Account': 'NOSUCHACCOUNT00', 'Reference': 'FRESHREF01'},
+            {'Account': 'short', 'Reference': 'bad-ref'},
+            {'Account': '', 'Reference': None},
+        ]
+        with self.assertNumQueries(2):
+            batch = validate_transaction_batch(rows)
+        codes = {index: {field: [e.code for e in errors] for field, errors in batch.row_errors(index).items()}
+                 for index in range(len(rows))}
+        self.assertEqual(codes, {
+            0: {},
+            1: {'Reference': ['unique']},
+            2: {'Account': ['unknown_account'], 'Reference': ['duplicate']},
+            3: {'Account': ['invalid'], 'Reference': ['invalid']},
+            4: {},
+        })
+        self.assertEqual(list(batch.customers), ['CUSTVALIDATE001'])
+
+    def test_empty_batch_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            batch = validate_transaction_batch([{'Account': '', 'Reference': ''}])
+        self.assertEqual(batch.errors, {})
+
+
+class ReferenceAllocatorTest(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(Account='CUSTALLOCATE001', Name='Allocator', Balance=Decimal('0.00'))
+
+    def test_blocks_start_after_existing_references(self):
+        for reference in ['ZZ00000041', 'ZZ0000004X', 'ZZ00000007']:
+            Transaction.objects.create(Account=self.customer, Date=timezone.now(), Amount=Decimal('1.00'),
+                                       DC='D', Reference=reference)
+        allocator = ReferenceAllocator('ZZ', block_size=3)
+        with self.assertNumQueries(4):
+            # Creating the sequence looks up the highest live and archived reference
+            self.assertEqual(allocator.allocate(2), ['ZZ00000042', 'ZZ00000043'])
+        with self.assertNumQueries(1):
+            self.assertEqual(allocator.allocate(4), ['ZZ00000044', 'ZZ00000045', 'ZZ00000046', 'ZZ00000047'])
+        # Another allocator continues after the reserved blocks
+        self.assertEqual(ReferenceAllocator('ZZ', block_size=3).allocate(1), ['ZZ00000048'])
+
+    def test_rolled_back_block_is_not_reused(self):
+        allocator = ReferenceAllocator('RB', block_size=10)
+        with transaction.atomic():
+            first = allocator.allocate(1)
+            transaction.set_rollback(True)
+        # The reservation was rolled back with the transaction, so another
+        # allocator may now reserve the same numbers; this one must not
+        ReferenceAllocator('RB', block_size=10).allocate(10)
+        self.assertEqual(first, ['RB00000001'])
+        self.assertEqual(allocator.allocate(1), ['RB00000011'])
+
+    def test_blank_references_are_generated(self):
+        call_command('populate_data', stdout=StringIO())
+        self.assertEqual(Transaction.objects.filter(Reference__startswith='INV').count(), 3)
+        response = self.client.post(reverse('transaction_add'), {
+            'Account': self.customer.Account, 'Date': '2025-08-11 12:00:00', 'Amount': '5.00', 'DC': 'D',
+            'Reference': ''})
+        self.assertEqual(response.status_code, 302)
+        reference = Transaction.objects.get(Account=self.customer).Reference
+        self.assertRegex(reference, r'^R[0-9]{9}$')
+
+    def test_clients_cannot_take_generated_references(self):
+        row = {'Account': self.customer.Account, 'Date': '2025-08-11 12:00:00', 'Amount': '5.00', 'DC': 'D'}
+        # Before anything is allocated, R000000001 is the first number to be handed out
+        response = self.client.post(reverse('transaction_add'), {**row, 'Reference': 'R000000001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('generated', response.context['form'].errors['Reference'][0])
+        response = self.client.post(reverse('transaction_batch'), json.dumps([
+            {**row, 'Reference': 'R000000002'}, {**row, 'Reference': 'RX00000002'}, row,
+        ]), content_type='application/json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['error', 'created', 'created'])
+        self.assertEqual(response.json()['results'][0]['errors']['Reference'][0]['code'], 'generated')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'import.csv')
+            with open(path, 'w', newline='') as f:
+                f.write('Account,Date,Amount,DC,Reference\n'
+                        f'{self.customer.Account},2025-08-11T12:00:00,1.00,D,R000000003\n'
+                        f'{self.customer.Account},2025-08-11T12:00:00,1.00,D,\n')
+            err = StringIO()
+            call_command('import_transactions', path, stdout=StringIO(), stderr=err)
+        self.assertIn('R000000003 has the form of a generated reference', err.getvalue())
+
+        references = set(Transaction.objects.values_list('Reference', flat=True))
+        self.assertEqual(references, {'RX00000002', 'R000000001', 'R000000002'})
+        # Editing a transaction keeps its generated reference
+        transaction_row = Transaction.objects.get(Reference='R000000001')
+        response = self.client.post(reverse('transaction_edit', args=[transaction_row.pk]),
+                                    {**row, 'Amount': '6.00', 'Reference': 'R000000001'})
+        self.assertEqual(response.status_code, 302)
+
+
+class ReferenceAllocatorThreadTest(TransactionTestCase):
+
+    def test_threads_never_share_references(self):
+        results = []
+
+        def allocate():
+            try:
+                for _ in range(25):
+                    # Writers may collide on the database lock; retry the reservation
+                    while True:
+                        try:
+                            results.extend(allocate_references(10))
+                            break
+                        except OperationalError:
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with self.settings(REFERENCE_BLOCK_SIZE=100):
+            threads = [threading.Thread(target=allocate) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 1000)
+        self.assertEqual(len(set(results)), 1000)
+
+
+class LockRetryTest(TestCase):
+
+    def _flaky(self, failures, message='database is locked'):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'written'
+        return write, calls
+
+    @patch('core.database.time.sleep')
+    def test_retries_locked_writes_with_backoff(self, sleep):
+        write, calls = self._flaky(2)
+        # The test case itself runs in a transaction; retries only happen outside one
+        with patch.object(connection, 'in_atomic_block', False), \
+                self.assertLogs('core.database', level='WARNING') as logs:
+            self.assertEqual(retry_on_lock(write)(), 'written')
+        self.assertEqual(len(calls), 3)
+        self.assertLess(sleep.call_args_list[0][0][0], sleep.call_args_list[1][0][0])
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('database locked, retry 1 of 4', logs.output[0])
+
+        write, calls = self._flaky(10)
+        with patch.object(connection, 'in_atomic_block', False), self.assertRaises(OperationalError), \
+                self.assertLogs('core.database', level='WARNING') as logs:
+            retry_on_lock(attempts=3)(write)()
+        self.assertEqual(len(calls), 3)
+        self.assertIn('retry 2 of 2', logs.output[-1])
+
+    def test_other_errors_and_nested_writes_are_not_retried(self):
+        write, calls = self._flaky(1, message='no such table: core_missing')
+        with patch.object(connection, 'in_atomic_block', False), self.assertRaises(OperationalError):
+            retry_on_lock(write)()
+        write, calls = self._flaky(1)
+        with self.assertRaises(OperationalError):
+            retry_on_lock(write)()
+        self.assertEqual(len(calls), 1)
+
+
+class BenchmarkContentionCommandTest(TestCase):
+
+    def test_configured_profile_loses_no_writes(self):
+        out = StringIO()
+        call_command('benchmark_contention', writers=3, readers=2, writes=20, stdout=out, stderr=StringIO())
+        results = {result['profile']: result for result in json.loads(out.getvalue())['results']}
+        self.assertEqual(set(results), {'default', 'configured'})
+        self.assertEqual(results['configured']['writes'], 60)
+        self.assertEqual(results['configured']['write_errors'], 0)
+        self.assertEqual(results['default']['writes'] + results['default']['write_errors'], 60)
+
+
+@patch('core.middleware.replica_configured', return_value=True)
+@patch('core.routers.replica_configured', return_value=True)
+class ReplicaRoutingTest(TestCase):
+
+    def _routed(self, request):
+        routed = {}
+
+        def view(request):
+            router = ReplicaRouter()
+            routed.update(customer=router.db_for_read(Customer), user=router.db_for_read(User),
+                          write=router.db_for_write(Customer))
+            return HttpResponse()
+        response = ReplicaRoutingMiddleware(view)(request)
+        return routed, response
+
+    def test_list_and_enquiry_views_read_from_replica(self, *mocks):
+        factory = RequestFactory()
+        for name in ('customer_list', 'transaction_list', 'enquiry_customer_list'):
+            routed, response = self._routed(factory.get(reverse(name)))
+            self.assertEqual(routed, {'customer': 'replica', 'user': None, 'write': 'default'}, name)
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+        routed, _ = self._routed(factory.get(reverse('customer_add')))
+        self.assertEqual(routed['customer'], None)
+        self.assertEqual(ReplicaRouter().db_for_read(Customer), None)
+
+    def test_writes_pin_client_to_primary(self, *mocks):
+        factory = RequestFactory()
+        routed, response = self._routed(factory.post(reverse('customer_list')))
+        self.assertEqual(routed['customer'], None)
+        pin = response.cookies[PIN_COOKIE]
+        self.assertGreater(float(pin.value), time.time())
+
+        request = factory.get(reverse('customer_list'))
+        request.COOKIES[PIN_COOKIE] = pin.value
+        routed, _ = self._routed(request)
+        self.assertEqual(routed['customer'], None)
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        routed, _ = self._routed(request)
+        self.assertEqual(routed['customer'], 'replica')
+
+
+class ReplicateDbCommandTest(TransactionTestCase):
+
+    def test_copies_primary_to_replica_file(self):
+        Customer.objects.create(Account='REPLICA00000001', Name='Replicated', Balance=Decimal('12.50'))
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'replica.sqlite3')
+            call_command('replicate_db', target=target, stderr=StringIO())
+            replica = sqlite3.connect(target)
+            try:
+                rows = replica.execute('SELECT "Name" FROM core_customer WHERE "Account" = ?',
+                                       ['REPLICA00000001']).fetchall()
+            finally:
+                replica.close()
+        self.assertEqual(rows, [('Replicated',)])
+
+    def test_requires_a_separate_replica(self):
+        # No REPLICA_DB_PATH is set for test runs
+        with self.assertRaises(CommandError):
+            call_command('replicate_db', stderr=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('replicate_db', target=connection.settings_dict['NAME'], stderr=StringIO())
+
+
+class FileDatabaseTestCase(TransactionTestCase):
+    """
+    Adds ``alias`` as a SQLite file in a temporary directory, for tests that
+    need a database other connections or processes can open; the test
+    database itself is in memory.
+    """
+    alias = None
+    options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, f'{cls.alias}.sqlite3')
+        # Added once the test run is set up, as the alias exists only here;
+        # marked as a mirror only so the test case does not flush it
+        connections.settings[cls.alias] = {
+            **connection.settings_dict, 'NAME': cls.path, 'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            'OPTIONS': cls.options,
+        }
+        cls.databases = {DEFAULT_DB_ALIAS, cls.alias}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.alias].close()
+        del connections[cls.alias]
+        del connections.settings[cls.alias]
+        del cls.databases
+        cls.directory.cleanup()
+
+
+@override_settings(DATABASE_ROUTERS=['core.routers.ReplicaRouter'])
+class ReplicaDatabaseTest(FileDatabaseTestCase):
+    """Routes the customer list through a real replica file, as REPLICA_DB_PATH would."""
+
+    alias = REPLICA_DATABASE
+    options = {'init_command': 'PRAGMA query_only=ON;'}
+
+    def _names(self, client):
+        response = client.get(reverse('customer_list'))
+        self.assertEqual(response.status_code, 200)
+        return {customer.Name for customer in response.context['customers']}
+
+    def test_list_reads_from_replica_once_it_is_ready(self):
+        Customer.objects.create(Account='REPLICA00000001', Name='Copied', Balance=Decimal('0.00'))
+        # An empty file, as the first connection to a missing replica leaves
+        # behind, is not read from
+        open(self.path, 'w').close()
+        self.assertEqual(self._names(self.client), {'Copied'})
+
+        call_command('replicate_db', stderr=StringIO())
+        Customer.objects.create(Account='REPLICA00000002', Name='Not copied', Balance=Decimal('0.00'))
+        self.assertEqual(self._names(self.client), {'Copied'})
+
+        # A client that has just written reads its own writes from the primary
+        self.client.post(reverse('customer_add'), {'Account': 'REPLICA00000003', 'Name': 'Written',
+                                                   'Balance': '0.00'})
+        self.assertEqual(self._names(self.client), {'Copied', 'Not copied', 'Written'})
+
+        # So does everyone once the copy is older than the allowed lag
+        with self.settings(REPLICA_MAX_LAG_SECONDS=0):
+            self.assertEqual(self._names(Client()), {'Copied', 'Not copied', 'Written'})
+
+
+class ReconcileBalancesCommandTest(TestCase):
+
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(Account=f'CUSTRECONCILE{i:02d}', Name=f'Reconcile {i}', Balance=Decimal('50.00'))
+            for i in range(5)
+        ]
+        post_transactions([
+            Transaction(Account=customer, Date=timezone.now(), Amount=Decimal('7.25'), DC='D' if n % 2 else 'C',
+                        Reference=f'RECON{i}{n:04d}')
+            for i, customer in enumerate(self.customers)
+            for n in range(3)
+        ])
+
+    def _reconcile(self, **options):
+        out = StringIO()
+        call_command('reconcile_balances', workers=2, range_size=2, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def _drift(self, customer, amount):
+        Customer.objects.filter(pk=customer.pk).update(Balance=F('Balance') + amount)
+
+    def test_reports_and_repairs_drift(self):
+        self.assertEqual(self.customers[0].OpeningBalance, Decimal('50.00'))
+        self.assertIn('Checked 5 accounts in 3 ranges', self._reconcile())
+
+        self._drift(self.customers[1], Decimal('3.00'))
+        self._drift(self.customers[4], Decimal('-0.10'))
+        out = self._reconcile()
+        self.assertIn('CUSTRECONCILE01: balance 45.75, transactions give 42.75 (off by 3.00)', out)
+        self.assertIn('CUSTRECONCILE04: balance 42.65, transactions give 42.75 (off by -0.10)', out)
+        self.assertIn('2 drifted', out)
+        self.assertEqual(Customer.objects.get(pk=self.customers[1].pk).Balance, Decimal('45.75'))
+
+        self.assertIn('all repaired', self._reconcile(repair=True))
+        self.assertEqual(set(Customer.objects.values_list('Balance', flat=True)), {Decimal('42.75')})
+        self.assertIn('0 drifted', self._reconcile())
+
+    def test_incremental_run_checks_accounts_written_since_last_run(self):
+        self.assertIn('Checked 5 accounts', self._reconcile(incremental=True))
+        watermark = BalanceReconciliation.objects.get().Checked
+
+        # Drift without a ledger write is only found by a full run
+        self._drift(self.customers[0], Decimal('1.00'))
+        post_transactions([Transaction(Account=self.customers[2], Date=timezone.now(), Amount=Decimal('1.00'),
+                                       DC='D', Reference='RECONLATE1')])
+        self._drift(self.customers[2], Decimal('1.00'))
+        out = self._reconcile(incremental=True)
+        self.assertIn('Checked 1 accounts', out)
+        self.assertIn('CUSTRECONCILE02', out)
+        # Unrepaired drift keeps the watermark, so the account stays due
+        self.assertEqual(BalanceReconciliation.objects.get().Checked, watermark)
+        self.assertIn('CUSTRECONCILE00', self._reconcile())
+
+    def test_derived_opening_balances_are_reported(self):
+        self.assertNotIn('derived', self._reconcile())
+        Customer.objects.filter(pk__in=[c.pk for c in self.customers[:2]]).update(OpeningBalanceDerived=True)
+        out = self._reconcile()
+        self.assertIn('0 drifted', out)
+        self.assertIn('2 of the accounts were checked against an opening balance derived', out)
+
+
+class ReconcilePoolTest(FileDatabaseTestCase):
+    """Runs check_ranges() in worker processes, which need a database file to share."""
+
+    alias = 'reconcile'
+
+    def test_workers_check_ranges_from_a_file_database(self):
+        customers = [
+            Customer.objects.create(Account=f'CUSTPOOL{i:07d}', Name=f'Pool {i}', Balance=Decimal('20.00'))
+            for i in range(12)
+        ]
+        post_transactions([
+            Transaction(Account=customer, Date=timezone.now(), Amount=Decimal('1.50'), DC='D',
+                        Reference=f'POOL{i:06d}')
+            for i, customer in enumerate(customers)
+        ])
+        Customer.objects.filter(pk=customers[7].pk).update(Balance=F('Balance') + 2)
+        call_command('replicate_db', target=self.path, stderr=StringIO())
+
+        with patch('core.reconcile.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            checked, derived, drift = check_ranges(account_ranges(3), workers=3, using=self.alias)
+        pool.assert_called_once()
+        self.assertEqual((checked, derived), (12, 0))
+        self.assertEqual(drift, [('CUSTPOOL0000007', Decimal('23.50'), Decimal('21.50'))])
@@ -0,0 +1,209 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.ledger import post_transactions
+from core.models import Customer, Transaction
+
+
+# Slow request logs would only repeat the query counts checked here
+@override_settings(SLOW_REQUEST_MS=60000)
+class QueryBudgetTest(TestCase):
+    """
+    Asserts a fixed maximum number of queries for every view and form
+    submission, measured on a seeded dataset and again after the dataset has
+    grown. A view whose query count changes with the number of rows (an N+1
+    lookup, a per-form save) fails here.
+    """
+
+    CUSTOMERS = 30
+    TRANSACTIONS = 1500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed(0)
+
+    @classmethod
+    def seed(cls, batch):
+        customers = Customer.objects.bulk_create(
+            Customer(Account=f'BUDGET{batch}{i:08d}', Name=f'Budget {batch} {i}', Balance=Decimal('0.00'))
+            for i in range(cls.CUSTOMERS)
+        )
+        start = timezone.now() - timedelta(days=400)
+        post_transactions([
+            Transaction(
+                Account=customers[i % cls.CUSTOMERS],
+                Date=start + timedelta(days=i % 400, minutes=i),
+                Amount=Decimal(i % 300) + Decimal('0.25'),
+                DC='D' if i % 3 else 'C',
+                Reference=f'BUD{batch}{i:06d}',
+            )
+            for i in range(cls.TRANSACTIONS)
+        ])
+        return customers
+
+    def setUp(self):
+        self.client = Client()
+        self.customer = Customer.objects.order_by('Account').first()
+        self.transaction = Transaction.objects.filter(Account=self.customer).order_by('Number').first()
+        self.requests = 0
+        self.batches = 0
+        self.accounts = list(Customer.objects.order_by('Account').values_list('Account', flat=True)[:5])
+
+    def count_queries(self, make_request):
+        self.requests += 1
+        with CaptureQueriesContext(connection) as ctx:
+            response = make_request(self.requests)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, response)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, budget, make_request):
+        """
+        Run make_request(n) against the seeded data and again after adding
+        more customers and transactions; n is unique per call so form
+        submissions can use fresh references.
+        """
+        before = self.count_queries(make_request)
+        self.batches += 1
+        self.seed(self.batches)
+        after = self.count_queries(make_request)
+        self.assertLessEqual(before, budget, f'{before} queries, budget is {budget}')
+        self.assertEqual(before, after, 'Query count grows with the number of rows')
+
+    def transaction_data(self, n, **overrides):
+        return {
+            'Account': self.customer.Account,
+            'Date': '2025-08-11 12:00:00',
+            'Amount': '10.00',
+            'DC': 'D',
+            'Reference': f'BUDGETX{n:03d}',
+            **overrides,
+        }
+
+    def bulk_data(self, n, rows):
+        data = {
+            'form-TOTAL_FORMS': str(rows),
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for i in range(rows):
+            # Spread rows over several accounts, as a real batch would
+            data.update({
+                f'form-{i}-Account': self.accounts[i % len(self.accounts)],
+                f'form-{i}-Date': '2025-08-11 12:00:00',
+                f'form-{i}-Amount': '1.00',
+                f'form-{i}-DC': 'D' if i % 2 else 'C',
+                f'form-{i}-Reference': f'BLK{n:02d}{i:05d}',
+            })
+        return data
+
+    def test_customer_views(self):
+        self.assertQueryBudget(2, lambda n: self.client.get(reverse('customer_list')))
+        self.assertQueryBudget(4, lambda n: self.client.get(reverse('customer_list'), {'q': 'Budget 1'}))
+        self.assertQueryBudget(2, lambda n: self.client.get(reverse('customer_list'), {'sort_by': 'Name', 'order': 'desc'}))
+        self.assertQueryBudget(0, lambda n: self.client.get(reverse('customer_add')))
+        self.assertQueryBudget(7, lambda n: self.client.post(reverse('customer_add'), {
+            'Account': f'BUDGETNEW{n:06d}', 'Name': 'New Budget', 'Balance': '0.00'}))
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('customer_edit', args=[self.customer.pk])))
+        self.assertQueryBudget(8, lambda n: self.client.post(reverse('customer_edit', args=[self.customer.pk]),
+                                                             {'Name': f'Renamed {n}'}))
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('customer_delete', args=[self.customer.pk])))
+
+    def test_customer_delete(self):
+        def delete(n):
+            customer = Customer.objects.filter(Account__startswith='BUDGET').order_by('-Account')[n]
+            return self.client.post(reverse('customer_delete', args=[customer.pk]))
+        self.assertQueryBudget(11, delete)
+
+    def test_transaction_list(self):
+        url = reverse('transaction_list')
+        self.assertQueryBudget(2, lambda n: self.client.get(url))
+        self.assertQueryBudget(2, lambda n: self.client.get(url, {'page_size': 500}))
+        self.assertQueryBudget(2, lambda n: self.client.get(url, {'sort_by': 'Amount', 'order': 'desc'}))
+        self.assertQueryBudget(2, lambda n: self.client.get(url, {'q': 'BUD0000'}))
+        # A date filter looks up how far the archive reaches, and reads it
+        # only when the range goes back that far
+        self.assertQueryBudget(3, lambda n: self.client.get(url, {'start_date': '2000-01-01'}))
+        cursor = self.client.get(url).context['next_query']
+        self.assertQueryBudget(2, lambda n: self.client.get(url + '?' + cursor))
+
+    def test_transaction_export(self):
+        # Every row fits in one export chunk
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('transaction_export'), {'q': 'BUD0000'}))
+
+    def test_transaction_forms(self):
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('transaction_add')))
+        # The reference is checked against live and archived transactions
+        self.assertQueryBudget(11, lambda n: self.client.post(reverse('transaction_add'), self.transaction_data(n)))
+        edit_url = reverse('transaction_edit', args=[self.transaction.pk])
+        self.assertQueryBudget(2, lambda n: self.client.get(edit_url))
+        self.assertQueryBudget(13, lambda n: self.client.post(edit_url, self.transaction_data(
+            n, Reference=self.transaction.Reference, Amount=f'{n}.00')))
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('transaction_delete', args=[self.transaction.pk])))
+
+    def test_transaction_delete(self):
+        def delete(n):
+            transaction = Transaction.objects.order_by('-Number')[n]
+            return self.client.post(reverse('transaction_delete', args=[transaction.pk]))
+        self.assertQueryBudget(11, delete)
+
+    def test_bulk_add(self):
+        url = reverse('bulk_add_transactions')
+        self.assertQueryBudget(1, lambda n: self.client.get(url, {'num_forms': 3 if n == 1 else 300}))
+        self.assertQueryBudget(11, lambda n: self.client.post(url, self.bulk_data(n, 5 if n == 1 else 200)))
+
+    def test_bulk_add_with_errors(self):
+        existing = self.transaction.Reference
+
+        def post(n):
+            data = self.bulk_data(n, 5 if n == 1 else 200)
+            data['form-0-Reference'] = existing
+            data['form-1-Account'] = 'NOSUCHACCOUNT00'
+            return self.client.post(reverse('bulk_add_transactions'), data)
+        self.assertQueryBudget(3, post)
+
+    def test_transaction_batch(self):
+        def post(n):
+            rows = [
+                {'Account': self.accounts[i % len(self.accounts)], 'Date': '2025-08-11T12:00:00',
+                 'Amount': '1.00', 'DC': 'D' if i % 2 else 'C', 'Reference': f'API{n:02d}{i:05d}'}
+                for i in range(5 if n == 1 else 200)
+            ]
+            rows[0]['Reference'] = self.transaction.Reference
+            return self.client.post(reverse('transaction_batch'), json.dumps(rows), content_type='application/json')
+        self.assertQueryBudget(11, post)
+
+    def test_enquiries(self):
+        account = self.customer.Account
+        self.assertQueryBudget(1, lambda n: self.client.get(reverse('enquiry_customer_list')))
+        self.assertQueryBudget(3, lambda n: self.client.get(reverse('enquiry_transaction_details', args=[account])))
+        self.assertQueryBudget(3, lambda n: self.client.get(reverse('enquiry_transaction_details', args=[account]),
+                                                            {'sort_by': 'Amount', 'order': 'desc'}))
+        at = (timezone.now() - timedelta(days=200)).isoformat()
+        # Live and archived transactions are summed separately
+        self.assertQueryBudget(5, lambda n: self.client.get(reverse('enquiry_balance_at', args=[account]), {'at': at}))
+
+    def test_reports(self):
+        url = reverse('report_period_totals')
+        self.assertQueryBudget(1, lambda n: self.client.get(url))
+        self.assertQueryBudget(2, lambda n: self.client.get(url, {'group_by': 'account'}))
+        self.assertQueryBudget(1, lambda n: self.client.get(url, {'account': self.customer.Account,
+                                                                  'start_date': '2000-01-01'}))
+        # Closed and open periods are one grouped query each (the cache is
+        # dropped by every seed, which back-dates transactions), hours also
+        # look up the archive boundary
+        cache.clear()
+        url = reverse('report_volume')
+        self.assertQueryBudget(2, lambda n: self.client.get(url))
+        self.assertQueryBudget(3, lambda n: self.client.get(url, {'interval': 'hour', 'account': self.customer.Account}))
+        self.assertQueryBudget(0, lambda n: self.client.get(reverse('metrics')))
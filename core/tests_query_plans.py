@@ -0,0 +1,129 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.ledger import post_transactions
+from core.models import Customer, Transaction
+
+FULL_SCAN = re.compile(r'^SCAN core_transaction$')
+FULL_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+SORT_COLUMNS = ['Number', 'Reference', 'Account__Account', 'Date', 'Amount', 'DC']
+
+
+class TransactionQueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every Transaction query issued by the list and
+    enquiry views and fails if one of them reads the whole table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = [
+            Customer.objects.create(Account=f'CUSTPLAN{i:07d}', Name=f'Plan {i}', Balance=Decimal('0.00'))
+            for i in range(20)
+        ]
+        start = timezone.now() - timedelta(days=1000)
+        post_transactions([
+            Transaction(
+                Account=cls.customers[i % 20],
+                Date=start + timedelta(days=i % 1000, minutes=i),
+                Amount=Decimal(i % 700),
+                DC='D' if i % 3 else 'C',
+                Reference=f'PLAN{i:06d}'
+            )
+            for i in range(4000)
+        ])
+        # Give the planner table statistics, as PRAGMA optimize would in production
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = Client()
+
+    def transaction_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and 'core_transaction' in sql:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plans.append((sql, [row[3] for row in cursor.fetchall()]))
+        self.assertTrue(plans, f'No Transaction query issued for {url} {params}')
+        return response, plans
+
+    def assertNoFullScan(self, plans, allow_rowid_scan=False, allow_sort=True):
+        for sql, plan in plans:
+            details = '\n'.join(plan)
+            if not allow_rowid_scan:
+                self.assertFalse(any(FULL_SCAN.match(line) for line in plan),
+                                 f'Full table scan:\n{details}\n{sql}')
+            if not allow_sort:
+                self.assertNotIn(FULL_SORT, plan, f'Full sort:\n{details}\n{sql}')
+
+    def test_transaction_list_default_order(self):
+        # The default Number order walks the rowid and stops at the page size
+        response, plans = self.transaction_plans(reverse('transaction_list'))
+        self.assertNoFullScan(plans, allow_rowid_scan=True, allow_sort=False)
+        _, plans = self.transaction_plans(reverse('transaction_list') + '?' + response.context['next_query'])
+        self.assertNoFullScan(plans, allow_sort=False)
+
+    def test_transaction_list_sorts(self):
+        for field in SORT_COLUMNS[1:]:
+            for order in ('asc', 'desc'):
+                with self.subTest(field=field, order=order):
+                    params = {'sort_by': field, 'order': order}
+                    response, plans = self.transaction_plans(reverse('transaction_list'), params)
+                    self.assertNoFullScan(plans, allow_sort=False)
+                    # Deeper pages seek into the index instead of rescanning it
+                    _, plans = self.transaction_plans(
+                        reverse('transaction_list') + '?' + response.context['next_query'])
+                    self.assertNoFullScan(plans, allow_sort=False)
+
+    def test_transaction_list_date_ranges(self):
+        today = timezone.now().date()
+        ranges = [
+            {'start_date': (today - timedelta(days=30)).isoformat()},
+            {'end_date': (today - timedelta(days=900)).isoformat()},
+            {'start_date': (today - timedelta(days=60)).isoformat(), 'end_date': (today - timedelta(days=30)).isoformat()},
+        ]
+        for date_range in ranges:
+            for sort in ({}, {'sort_by': 'Date', 'order': 'desc'}, {'sort_by': 'Amount', 'order': 'asc'}):
+                with self.subTest(**date_range, **sort):
+                    _, plans = self.transaction_plans(reverse('transaction_list'), {**date_range, **sort})
+                    self.assertNoFullScan(plans)
+
+    def test_transaction_search(self):
+        _, plans = self.transaction_plans(reverse('transaction_list'), {'q': 'PLAN00012'})
+        self.assertNoFullScan(plans, allow_sort=False)
+
+    def test_enquiry_transaction_details(self):
+        account = self.customers[3].Account
+        for field in SORT_COLUMNS:
+            if field == 'Account__Account':
+                continue
+            for order in ('asc', 'desc'):
+                with self.subTest(field=field, order=order):
+                    _, plans = self.transaction_plans(
+                        reverse('enquiry_transaction_details', args=[account]), {'sort_by': field, 'order': order})
+                    self.assertNoFullScan(plans)
+                    self.assertTrue(any('Account_id=?' in line for _, plan in plans for line in plan))
+
+    def test_enquiry_default_date_order_needs_no_sort(self):
+        _, plans = self.transaction_plans(reverse('enquiry_transaction_details', args=[self.customers[5].Account]))
+        self.assertNoFullScan(plans, allow_sort=False)
+
+    def test_balance_at(self):
+        at = (timezone.now() - timedelta(days=500)).isoformat()
+        _, plans = self.transaction_plans(
+            reverse('enquiry_balance_at', args=[self.customers[7].Account]), {'at': at})
+        self.assertNoFullScan(plans)
@@ -1,11 +1,25 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from unittest.mock import patch
 from django.urls import reverse
-from core.models import Customer, Transaction
+from core.models import ArchivedTransaction, BalanceCheckpoint, Customer, DailyAccountTotals, Transaction
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.utils import timezone
 from core.forms import TransactionForm
+from django.core.management import call_command
+from io import BytesIO, StringIO
+import csv
+import json
+from django.db import OperationalError, connection
+from django.db.models import F
+import threading
+import time
+from django.test.utils import CaptureQueriesContext
+from core.ledger import post_transactions
+from core.metrics import registry as metrics_registry
+from core.caching import ENQUIRY_CUSTOMERS_KEY
+from core.jsonstream import InputTooLarge, iter_json_array
+from django.core.cache import cache
 
 class CustomerViewsTest(TestCase):
 
@@ -392,3 +406,884 @@ class TransactionViewsTest(TestCase):
         self.assertEqual(response.status_code, 200) # Expect 200 because form is re-rendered with error
         self.assertContains(response, "An error occurred: Simulated save error") # Check for the error message
         
+
+class TransactionListPaginationTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.customer = Customer.objects.create(Account='CUSTPAGE0000001', Name='Pager', Balance=Decimal('0.00'))
+        # Pairs of rows share an Amount so the Number tiebreak is exercised
+        for i in range(7):
+            Transaction.objects.create(
+                Account=self.customer,
+                Date=timezone.make_aware(datetime(2025, 8, 1 + i, 12, 0, 0)),
+                Amount=Decimal(10 * (i // 2)),
+                DC='D',
+                Reference=f'PAGEREF{i:03d}'
+            )
+
+    def _walk(self, params):
+        numbers = []
+        response = self.client.get(reverse('transaction_list'), params)
+        while True:
+            numbers.extend(t.Number for t in response.context['transactions'])
+            if not response.context['next_query']:
+                return numbers, response
+            response = self.client.get(reverse('transaction_list') + '?' + response.context['next_query'])
+
+    def test_pages_cover_all_rows_in_order(self):
+        numbers, _ = self._walk({'sort_by': 'Amount', 'order': 'desc', 'page_size': 2})
+        expected = list(Transaction.objects.order_by('-Amount', '-Number').values_list('Number', flat=True))
+        self.assertEqual(numbers, expected)
+
+    def test_previous_page_returns_same_rows(self):
+        params = {'sort_by': ['Date', 'Amount'], 'order': ['desc', 'asc'], 'page_size': 3}
+        first = self.client.get(reverse('transaction_list'), params)
+        second = self.client.get(reverse('transaction_list') + '?' + first.context['next_query'])
+        back = self.client.get(reverse('transaction_list') + '?' + second.context['previous_query'])
+        self.assertEqual([t.Number for t in back.context['transactions']],
+                         [t.Number for t in first.context['transactions']])
+
+    def test_account_loaded_with_page_query(self):
+        # The ledger version lookup for conditional GET, then the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('transaction_list'))
+            for t in response.context['transactions']:
+                t.Account.Name
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('transaction_list'), {'after': 'not-a-cursor', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 2)
+
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.customer = Customer.objects.create(Account='CUSTSEARCH00001', Name='Alyce Walker', Balance=Decimal('0.00'))
+
+    def test_index_follows_customer_writes(self):
+        response = self.client.get(reverse('customer_list'), {'q': 'alice'})
+        self.assertContains(response, 'Alyce Walker')
+
+        self.customer.Name = 'Renamed Person'
+        self.customer.save()
+        response = self.client.get(reverse('customer_list'), {'q': 'walker'})
+        self.assertNotContains(response, 'Alyce Walker')
+        response = self.client.get(reverse('customer_list'), {'q': 'renamed'})
+        self.assertContains(response, 'Renamed Person')
+
+        self.customer.delete()
+        response = self.client.get(reverse('customer_list'), {'q': 'renamed'})
+        self.assertNotContains(response, 'Renamed Person')
+
+    def test_index_follows_transaction_writes(self):
+        transaction = Transaction.objects.create(
+            Account=self.customer, Date=timezone.now(), Amount=Decimal('12.00'), DC='D', Reference='FINDME0001'
+        )
+        response = self.client.get(reverse('transaction_list'), {'q': 'findme'})
+        self.assertContains(response, 'FINDME0001')
+
+        Transaction.objects.filter(pk=transaction.pk).update(Reference='MOVED00001')
+        response = self.client.get(reverse('transaction_list'), {'q': 'findme'})
+        self.assertNotContains(response, 'FINDME0001')
+
+    def test_terms_are_anded_and_ranked(self):
+        Customer.objects.create(Account='CUSTSEARCH00002', Name='Walker Walker', Balance=Decimal('0.00'))
+        Customer.objects.create(Account='CUSTOTHER000003', Name='Walker', Balance=Decimal('0.00'))
+        response = self.client.get(reverse('customer_list'), {'q': 'walker search'})
+        names = [c.Name for c in response.context['customers']]
+        self.assertEqual(names, ['Walker Walker', 'Alyce Walker'])
+
+    def test_short_terms_use_fallback(self):
+        response = self.client.get(reverse('customer_list'), {'q': 'ce wa'})
+        self.assertContains(response, 'Alyce Walker')
+
+    def test_phonetic_name_match(self):
+        response = self.client.get(reverse('customer_list'), {'q': 'Wolker'})
+        self.assertContains(response, 'Alyce Walker')
+        response = self.client.get(reverse('customer_list'), {'q': 'Alis wa'})
+        self.assertContains(response, 'Alyce Walker')
+
+    def test_backfill_name_keys_command(self):
+        Customer.objects.bulk_create([
+            Customer(Account=f'CUSTBULK{i:07d}', Name=f'Smyth {i}', Balance=Decimal('0.00')) for i in range(5)
+        ])
+        response = self.client.get(reverse('customer_list'), {'q': 'smith'})
+        self.assertNotContains(response, 'Smyth 0')
+
+        call_command('backfill_name_keys', chunk_size=2, stdout=StringIO())
+        response = self.client.get(reverse('customer_list'), {'q': 'smith'})
+        for i in range(5):
+            self.assertContains(response, f'Smyth {i}')
+
+class BulkPostingTest(TestCase):
+
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(Account=f'CUSTBULKPOST{i:03d}', Name=f'Bulk {i}', Balance=Decimal('100.00'))
+            for i in range(3)
+        ]
+
+    def _rows(self, count, prefix):
+        return [
+            Transaction(
+                Account=self.customers[i % 3],
+                Date=timezone.now(),
+                Amount=Decimal('1.50'),
+                DC='D' if i % 2 else 'C',
+                Reference=f'{prefix}{i:06d}'
+            )
+            for i in range(count)
+        ]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            post_transactions(self._rows(10, 'SMALL'))
+        with CaptureQueriesContext(connection) as large:
+            post_transactions(self._rows(300, 'LARGE'))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_balances_reflect_net_deltas(self):
+        post_transactions(self._rows(7, 'DELTA'))
+        balances = [c.Balance for c in Customer.objects.order_by('Account')]
+        # Rows 0,3,6 (C,D,C) / 1,4 (D,C) / 2,5 (C,D)
+        self.assertEqual(balances, [Decimal('98.50'), Decimal('100.00'), Decimal('100.00')])
+        self.assertEqual(Transaction.objects.count(), 7)
+
+    def test_bulk_form_reports_batch_validation_errors(self):
+        post_transactions(self._rows(1, 'TAKE'))
+        rows = [('CUSTBULKPOST000', 'TAKE000000'), ('NOSUCHACCOUNT00', 'FRESH00001'),
+                ('CUSTBULKPOST001', 'FRESH00002'), ('CUSTBULKPOST002', 'FRESH00002')]
+        data = {'form-TOTAL_FORMS': '4', 'form-INITIAL_FORMS': '0',
+                'form-MIN_NUM_FORMS': '0', 'form-MAX_NUM_FORMS': '1000'}
+        for i, (account, reference) in enumerate(rows):
+            data.update({f'form-{i}-Account': account, f'form-{i}-Date': '2025-08-11 12:00:00',
+                         f'form-{i}-Amount': '1.00', f'form-{i}-DC': 'D', f'form-{i}-Reference': reference})
+        response = Client().post(reverse('bulk_add_transactions'), data)
+        self.assertEqual(response.status_code, 200)
+        formset = response.context['formset']
+        self.assertEqual(formset.errors[0], {'Reference': ['Transaction with this Reference already exists.']})
+        self.assertIn('Account', formset.errors[1])
+        self.assertEqual(formset.errors[2], {})
+        self.assertEqual(formset.errors[3], {'Reference': ['Reference is repeated in this batch.']})
+        self.assertEqual(Transaction.objects.count(), 1)
+
+class TransactionBatchApiTest(TestCase):
+
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(Account=f'CUSTBATCHAPI{i:03d}', Name=f'Batch {i}', Balance=Decimal('100.00'))
+            for i in range(2)
+        ]
+        self.url = reverse('transaction_batch')
+
+    def _post(self, body):
+        return Client().post(self.url, body if isinstance(body, str) else json.dumps(body),
+                             content_type='application/json')
+
+    def test_valid_rows_are_written_and_invalid_rows_reported(self):
+        post_transactions([Transaction(Account=self.customers[0], Date=timezone.now(), Amount=Decimal('1.00'),
+                                       DC='D', Reference='TAKEN00001')])
+        rows = [
+            {'Account': 'CUSTBATCHAPI000', 'Date': '2025-08-11T12:00:00', 'Amount': 10.25, 'DC': 'D',
+             'Reference': 'APIROW0001'},
+            {'Account': 'NOSUCHACCOUNT00', 'Date': '2025-08-11T12:00:00', 'Amount': '1.00', 'DC': 'D',
+             'Reference': 'APIROW0002'},
+            {'Account': 'CUSTBATCHAPI001', 'Date': '2025-08-11T12:00:00', 'Amount': '2.50', 'DC': 'C',
+             'Reference': 'TAKEN00001'},
+            'not an object',
+            {'Account': 'CUSTBATCHAPI001', 'Date': '2025-08-11', 'Amount': '4.00', 'DC': 'C',
+             'Reference': 'APIROW0005'},
+            {'Account': 'CUSTBATCHAPI001'},
+        ]
+        response = self._post(rows)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 4))
+        results = data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'error', 'error', 'error', 'created', 'error'])
+        self.assertEqual([result['index'] for result in results], list(range(6)))
+        self.assertIn('Account', results[1]['errors'])
+        self.assertEqual(results[2]['errors']['Reference'][0]['code'], 'unique')
+        # The Reference is optional, a generated one is used when it is missing
+        self.assertEqual(set(results[5]['errors']), {'Date', 'Amount', 'DC'})
+
+        created = Transaction.objects.get(Number=results[0]['number'])
+        self.assertEqual(created.Amount, Decimal('10.25'))
+        balances = dict(Customer.objects.values_list('Account', 'Balance'))
+        self.assertEqual(balances, {'CUSTBATCHAPI000': Decimal('111.25'), 'CUSTBATCHAPI001': Decimal('96.00')})
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ['{"Account": "x"}', '[{"Account": "x"},', '[1] [2]']:
+            response = self._post(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.json())
+        # The test client sends no Content-Type with an empty body
+        self.assertEqual(self._post('').status_code, 415)
+        self.assertEqual(self._post([]).json(), {'created': 0, 'failed': 0, 'results': []})
+        self.assertEqual(Client().get(self.url).status_code, 405)
+
+    def test_body_is_read_in_chunks(self):
+        rows = [{'Account': 'CUSTBATCHAPI000', 'Date': '2025-08-11T12:00:00', 'Amount': '1.00', 'DC': 'D',
+                 'Reference': f'CHUNK{i:05d}'} for i in range(50)]
+        with patch('core.jsonstream.iter_json_array.__defaults__', (64, None)):
+            response = self._post(rows)
+        self.assertEqual(response.json()['created'], 50)
+
+    def test_only_json_bodies_are_accepted(self):
+        body = json.dumps([{'Account': 'CUSTBATCHAPI000', 'Date': '2025-08-11T12:00:00', 'Amount': '1.00',
+                            'DC': 'D', 'Reference': 'FORGED0001'}])
+        # What a cross-site <form enctype="text/plain"> would send
+        for content_type in ('text/plain', 'application/x-www-form-urlencoded', 'multipart/form-data; boundary=x'):
+            response = Client().post(self.url, body, content_type=content_type)
+            self.assertEqual(response.status_code, 415, content_type)
+        self.assertFalse(Transaction.objects.filter(Reference='FORGED0001').exists())
+        response = Client().post(self.url, body, content_type='application/json; charset=utf-8')
+        self.assertEqual(response.json()['created'], 1)
+
+    def test_batch_size_is_limited(self):
+        with patch('core.views.TRANSACTION_BATCH_MAX_ROWS', 2):
+            response = self._post([{}, {}, {}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_body_size_is_limited(self):
+        rows = [{'Account': 'CUSTBATCHAPI000', 'Reference': 'x' * 200}]
+        with patch('core.views.TRANSACTION_BATCH_MAX_BYTES', 100):
+            response = self._post(rows)
+        self.assertEqual(response.status_code, 413)
+
+        # Without a trustworthy Content-Length the parser stops at the cap
+        body = json.dumps(rows).encode()
+        with self.assertRaises(InputTooLarge):
+            list(iter_json_array(BytesIO(body), chunk_size=16, max_bytes=100))
+        self.assertEqual(list(iter_json_array(BytesIO(body), chunk_size=16, max_bytes=len(body))), rows)
+
+
+class TransactionExportTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        customer = Customer.objects.create(Account='CUSTEXPORT00001', Name='Exporter', Balance=Decimal('0.00'))
+        for i in range(5):
+            Transaction.objects.create(
+                Account=customer,
+                Date=timezone.make_aware(datetime(2025, 8, 10 + i, 9, 0, 0)),
+                Amount=Decimal(i + 1),
+                DC='D',
+                Reference=f'EXPORT{i:04d}'
+            )
+
+    def _csv_rows(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(content)))
+
+    @patch('core.views.EXPORT_CHUNK_SIZE', 2)
+    def test_export_streams_all_filtered_rows_in_list_order(self):
+        response = self.client.get(reverse('transaction_export'), {
+            'start_date': '2025-08-11', 'sort_by': 'Amount', 'order': 'desc'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = self._csv_rows(response)
+        self.assertEqual(rows[0][:3], ['Number', 'Reference', 'Account'])
+        self.assertEqual([row[1] for row in rows[1:]], ['EXPORT0004', 'EXPORT0003', 'EXPORT0002', 'EXPORT0001'])
+
+    def test_export_applies_search(self):
+        rows = self._csv_rows(self.client.get(reverse('transaction_export'), {'q': 'EXPORT0002'}))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], 'Exporter')
+
+    def test_invalid_dates_are_rejected(self):
+        response = self.client.get(reverse('transaction_export'), {'start_date': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'Invalid start date', response.content)
+        # Nothing is left behind for the next HTML page
+        response = self.client.get(reverse('transaction_list'))
+        self.assertEqual(list(response.context['messages']), [])
+
+class BalanceConcurrencyTest(TransactionTestCase):
+    THREADS = 8
+    POSTS_PER_THREAD = 25
+
+    def setUp(self):
+        self.customer = Customer.objects.create(Account='CUSTCONCURRENT1', Name='Concurrent', Balance=Decimal('0.00'))
+
+    def _post(self, thread_index):
+        client = Client()
+        try:
+            for i in range(self.POSTS_PER_THREAD):
+                data = {
+                    'Account': self.customer.Account,
+                    'Date': '2025-08-11 12:00:00',
+                    'Amount': '1.00',
+                    'DC': 'D',
+                    'Reference': f'CONC{thread_index:02d}{i:04d}',
+                }
+                # Writers may collide on the database lock; retry until posted
+                posted = False
+                while not posted:
+                    try:
+                        client.post(reverse('transaction_add'), data)
+                        posted = Transaction.objects.filter(Reference=data['Reference']).exists()
+                    except OperationalError:
+                        pass
+                    if not posted:
+                        time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_posts_lose_no_updates(self):
+        threads = [threading.Thread(target=self._post, args=(n,)) for n in range(self.THREADS)]
+        # Waiting out the lock makes requests slow; that is not what is tested
+        with self.settings(SLOW_REQUEST_MS=60000), self.assertLogs('core.database', level='WARNING') as logs:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        # The writers did collide, and every collision was retried
+        for message in logs.output:
+            self.assertIn('save_transaction: database locked, retry', message)
+
+        posted = self.THREADS * self.POSTS_PER_THREAD
+        self.assertEqual(Transaction.objects.count(), posted)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.Balance, Decimal(posted))
+
+    def test_balance_change_between_read_and_write_is_kept(self):
+        # Simulate another request adjusting the balance after this request
+        # loaded the customer but before it applied its own change
+        real_save = TransactionForm.save
+
+        def interleaved_save(form, *args, **kwargs):
+            Customer.objects.filter(pk=self.customer.pk).update(Balance=F('Balance') + Decimal('5.00'))
+            return real_save(form, *args, **kwargs)
+
+        with patch.object(TransactionForm, 'save', interleaved_save):
+            self.client.post(reverse('transaction_add'), {
+                'Account': self.customer.Account,
+                'Date': '2025-08-11 12:00:00',
+                'Amount': '1.00',
+                'DC': 'C',
+                'Reference': 'INTERLEAVE',
+            })
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.Balance, Decimal('4.00'))
+
+class BalanceAtTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        # Opening balance 100, then one debit of 10 per day from 1 to 10 August
+        self.customer = Customer.objects.create(Account='CUSTBALANCEAT01', Name='Checkpointed', Balance=Decimal('100.00'))
+        post_transactions([
+            Transaction(Account=self.customer, Date=timezone.make_aware(datetime(2025, 8, day, 12, 0, 0)),
+                        Amount=Decimal('10.00'), DC='D', Reference=f'BALAT{day:05d}')
+            for day in range(1, 11)
+        ])
+
+    def _balance(self, at):
+        response = self.client.get(reverse('enquiry_balance_at', args=[self.customer.Account]), {'at': at})
+        self.assertEqual(response.status_code, 200)
+        return Decimal(response.json()['balance'])
+
+    def test_balance_at_with_and_without_checkpoints(self):
+        expected = {'2025-07-31': Decimal('100.00'), '2025-08-03': Decimal('130.00'),
+                    '2025-08-05T12:00:00': Decimal('150.00'), '2025-08-20': Decimal('200.00')}
+        for at, balance in expected.items():
+            self.assertEqual(self._balance(at), balance)
+
+        call_command('checkpoint_balances', days=3, stdout=StringIO())
+        self.assertTrue(BalanceCheckpoint.objects.filter(Account=self.customer).count() > 1)
+        for at, balance in expected.items():
+            self.assertEqual(self._balance(at), balance)
+
+    def test_back_dated_update_invalidates_later_checkpoints(self):
+        call_command('checkpoint_balances', days=3, stdout=StringIO())
+        transaction = Transaction.objects.get(Reference='BALAT00009')
+        response = self.client.post(reverse('transaction_edit', args=[transaction.pk]), {
+            'Account': self.customer.Account,
+            'Date': '2025-08-02 00:00:00',
+            'Amount': '10.00',
+            'DC': 'D',
+            'Reference': transaction.Reference
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(BalanceCheckpoint.objects.filter(
+            Account=self.customer, Date__gte=timezone.make_aware(datetime(2025, 8, 2))).exists())
+        self.assertEqual(self._balance('2025-08-02'), Decimal('130.00'))
+        self.assertEqual(self._balance('2025-08-08'), Decimal('190.00'))
+
+    def test_invalid_timestamp(self):
+        response = self.client.get(reverse('enquiry_balance_at', args=[self.customer.Account]), {'at': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+class DailyAccountTotalsTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.customers = [
+            Customer.objects.create(Account=f'CUSTROLLUP0000{i}', Name=f'Rollup {i}', Balance=Decimal('0.00'))
+            for i in range(2)
+        ]
+
+    def _snapshot(self):
+        return sorted(DailyAccountTotals.objects.filter(Count__gt=0).values_list(
+            'Account_id', 'Day', 'DebitTotal', 'CreditTotal', 'Count'))
+
+    def test_incremental_rollup_matches_rebuild(self):
+        customer_a, customer_b = self.customers
+        post = self.client.post
+        post(reverse('transaction_add'), {'Account': customer_a.Account, 'Date': '2025-08-11 09:00:00',
+                                          'Amount': '10.00', 'DC': 'D', 'Reference': 'ROLLUP0001'})
+        post(reverse('transaction_add'), {'Account': customer_a.Account, 'Date': '2025-08-11 18:00:00',
+                                          'Amount': '4.00', 'DC': 'C', 'Reference': 'ROLLUP0002'})
+        post(reverse('bulk_add_transactions'), {
+            'form-0-Account': customer_b.Account, 'form-0-Date': '2025-08-12 12:00:00',
+            'form-0-Amount': '7.00', 'form-0-DC': 'D', 'form-0-Reference': 'ROLLUP0003',
+            'form-1-Account': customer_a.Account, 'form-1-Date': '2025-08-12 12:00:00',
+            'form-1-Amount': '3.00', 'form-1-DC': 'D', 'form-1-Reference': 'ROLLUP0004',
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0', 'form-MAX_NUM_FORMS': '1000',
+        })
+        moved = Transaction.objects.get(Reference='ROLLUP0002')
+        post(reverse('transaction_edit', args=[moved.pk]), {'Account': customer_b.Account, 'Date': '2025-08-13 08:00:00',
+                                                           'Amount': '5.00', 'DC': 'C', 'Reference': 'ROLLUP0002'})
+        post(reverse('transaction_delete', args=[Transaction.objects.get(Reference='ROLLUP0004').pk]))
+
+        incremental = self._snapshot()
+        self.assertEqual(len(incremental), 3)
+        call_command('rebuild_daily_totals', stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_period_totals_report(self):
+        post_transactions([
+            Transaction(Account=self.customers[i % 2], Date=timezone.make_aware(datetime(2025, 8, 1 + i, 12, 0, 0)),
+                        Amount=Decimal('2.50'), DC='D' if i % 3 else 'C', Reference=f'REPORT{i:04d}')
+            for i in range(6)
+        ])
+        response = self.client.get(reverse('report_period_totals'), {
+            'start_date': '2025-08-02', 'end_date': '2025-08-05', 'group_by': 'account'
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # Days 2-5 are i = 1..4: debits for 1, 2, 4 and a credit for 3
+        self.assertEqual((data['debit_total'], data['credit_total'], data['count']), ('7.50', '2.50', 4))
+        self.assertEqual([row['account'] for row in data['accounts']], [c.Account for c in self.customers])
+
+        response = self.client.get(reverse('report_period_totals'), {'start_date': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+class ReportVolumeTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.customers = [
+            Customer.objects.create(Account=f'CUSTVOLUME0000{i}', Name=f'Volume {i}', Balance=Decimal('0.00'))
+            for i in range(2)
+        ]
+        post_transactions([
+            Transaction(Account=self.customers[account], Date=timezone.make_aware(datetime(*when)),
+                        Amount=Decimal(amount), DC=dc, Reference=f'VOLUME{i:04d}')
+            for i, (account, when, amount, dc) in enumerate([
+                (0, (2025, 8, 4, 9, 0), '10.00', 'D'),
+                (1, (2025, 8, 4, 9, 30), '4.00', 'C'),
+                (0, (2025, 8, 5, 14, 0), '3.00', 'D'),
+                (1, (2025, 8, 12, 10, 0), '2.50', 'D'),
+                (0, (2025, 9, 1, 8, 0), '1.00', 'C'),
+            ])
+        ])
+
+    def get_volume(self, **params):
+        response = self.client.get(reverse('report_volume'), {'start_date': '2025-08-01', 'end_date': '2025-09-30',
+                                                              **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_buckets_per_interval(self):
+        data = self.get_volume()
+        self.assertEqual(data['buckets'], ['2025-08-04', '2025-08-05', '2025-08-12', '2025-09-01'])
+        self.assertEqual(data['debit'], ['10.00', '3.00', '2.50', '0.00'])
+        self.assertEqual(data['credit'], ['4.00', '0.00', '0.00', '1.00'])
+        self.assertEqual(data['count'], [2, 1, 1, 1])
+
+        data = self.get_volume(interval='week')
+        self.assertEqual(data['buckets'], ['2025-08-04', '2025-08-11', '2025-09-01'])
+        self.assertEqual(data['count'], [3, 1, 1])
+
+        data = self.get_volume(interval='month')
+        self.assertEqual(data['buckets'], ['2025-08-01', '2025-09-01'])
+        self.assertEqual((data['debit'], data['credit']), (['15.50', '0.00'], ['4.00', '1.00']))
+
+        data = self.get_volume(interval='week', account=self.customers[0].Account)
+        self.assertEqual(data['buckets'], ['2025-08-04', '2025-09-01'])
+        self.assertEqual(data['debit'], ['13.00', '0.00'])
+
+        response = self.client.get(reverse('report_volume'))
+        self.assertEqual(response.json()['end_date'], timezone.localdate().isoformat())
+        self.assertNotIn(b' ', response.content)
+
+    def test_hour_buckets_include_archived_transactions(self):
+        expected = self.get_volume(interval='hour', end_date='2025-08-31')
+        self.assertEqual(expected['buckets'], ['2025-08-04T09:00:00+00:00', '2025-08-05T14:00:00+00:00',
+                                               '2025-08-12T10:00:00+00:00'])
+        self.assertEqual(expected['count'], [2, 1, 1])
+
+        call_command('archive_transactions', older_than=90, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Transaction.objects.count(), 0)
+        cache.clear()
+        self.assertEqual(self.get_volume(interval='hour', end_date='2025-08-31'), expected)
+
+    def test_closed_periods_are_cached_until_backdated_writes(self):
+        self.get_volume()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_volume()['count'], [2, 1, 1, 1])
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('sales_cache_requests_total{cache="core:report_volume",result="hit"} 1', body)
+
+        self.client.post(reverse('transaction_add'), {'Account': self.customers[1].Account,
+                                                      'Date': '2025-08-05 16:00:00', 'Amount': '6.00',
+                                                      'DC': 'D', 'Reference': 'VOLUME0100'})
+        data = self.get_volume()
+        self.assertEqual(data['count'], [2, 2, 1, 1])
+        self.assertEqual(data['debit'][1], '9.00')
+
+    def test_invalid_parameters(self):
+        url = reverse('report_volume')
+        for params in ({'interval': 'minute'}, {'start_date': '2025-13-01'},
+                       {'start_date': '2025-08-02', 'end_date': '2025-08-01'},
+                       {'interval': 'hour', 'start_date': '2020-01-01', 'end_date': '2025-12-31'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+class RequestMetricsTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        Customer.objects.create(Account='CUSTMETRIC00001', Name='Metric Customer', Balance=Decimal('0.00'))
+
+    def test_metrics_report_latency_and_queries_per_view(self):
+        self.client.get(reverse('customer_list'))
+        self.client.get(reverse('customer_list'))
+        self.client.get('/no-such-page/')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('sales_http_requests_total{view="customer_list",status="200"} 2', body)
+        self.assertIn('sales_http_requests_total{view="<unresolved>",status="404"} 1', body)
+        self.assertIn('sales_http_request_duration_seconds_bucket{view="customer_list",le="+Inf"} 2', body)
+        self.assertIn('sales_http_request_duration_seconds_count{view="customer_list"} 2', body)
+        # The list view runs a version lookup and the list query per request
+        self.assertIn('sales_http_request_queries_sum{view="customer_list"} 4', body)
+        self.assertIn('sales_http_request_sql_seconds_total{view="customer_list"}', body)
+
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.settings(SLOW_REQUEST_MS=0):
+            with self.assertLogs('core.metrics', level='WARNING') as logs:
+                self.client.get(reverse('customer_list'))
+        self.assertIn('customer_list', logs.output[0])
+        self.assertIn('core_customer', logs.output[0])
+
+class EnquiryCustomerCacheTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.customer = Customer.objects.create(Account='CUSTCACHE000001', Name='Cached Customer',
+                                                Balance=Decimal('10.00'))
+
+    def get_list(self):
+        return self.client.get(reverse('enquiry_customer_list')).content.decode()
+
+    def test_second_request_is_served_from_cache(self):
+        self.get_list()
+        with self.assertNumQueries(0):
+            self.assertIn('Cached Customer', self.get_list())
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(f'sales_cache_requests_total{{cache="{ENQUIRY_CUSTOMERS_KEY}",result="hit"}} 1', body)
+        self.assertIn(f'sales_cache_requests_total{{cache="{ENQUIRY_CUSTOMERS_KEY}",result="miss"}} 1', body)
+
+    def test_customer_writes_invalidate(self):
+        self.get_list()
+        self.customer.Name = 'Renamed Customer'
+        self.customer.save()
+        self.assertIn('Renamed Customer', self.get_list())
+
+        Customer.objects.create(Account='CUSTCACHE000002', Name='Second Customer', Balance=Decimal('0.00'))
+        self.assertIn('Second Customer', self.get_list())
+
+        self.customer.delete()
+        self.assertNotIn('Renamed Customer', self.get_list())
+
+    def test_balance_changes_invalidate(self):
+        self.assertIn('10.00', self.get_list())
+        self.client.post(reverse('transaction_add'), {'Account': self.customer.Account, 'Date': '2025-08-11 12:00:00',
+                                                      'Amount': '2.50', 'DC': 'D', 'Reference': 'CACHE00001'})
+        self.assertIn('12.50', self.get_list())
+
+        post_transactions([Transaction(Account=self.customer, Date=timezone.now(), Amount=Decimal('5.00'),
+                                       DC='C', Reference='CACHE00002')])
+        self.assertIn('7.50', self.get_list())
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.customer_a = Customer.objects.create(Account='CUSTETAG0000001', Name='Etag A', Balance=Decimal('0.00'))
+        self.customer_b = Customer.objects.create(Account='CUSTETAG0000002', Name='Etag B', Balance=Decimal('0.00'))
+        post_transactions([Transaction(Account=self.customer_a, Date=timezone.now(), Amount=Decimal('1.00'),
+                                       DC='D', Reference='ETAG000001')])
+
+    def post(self, customer, reference):
+        post_transactions([Transaction(Account=customer, Date=timezone.now(), Amount=Decimal('2.00'),
+                                       DC='C', Reference=reference)])
+
+    def test_unchanged_poll_gets_304_after_one_query(self):
+        for url in (reverse('transaction_list'), reverse('customer_list'),
+                    reverse('enquiry_transaction_details', args=[self.customer_a.Account])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.content)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('transaction_list'))
+        response = self.client.get(reverse('transaction_list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        transactions_etag = self.client.get(reverse('transaction_list'))['ETag']
+        customers_etag = self.client.get(reverse('customer_list'))['ETag']
+
+        self.post(self.customer_b, 'ETAG000002')
+        response = self.client.get(reverse('transaction_list'), HTTP_IF_NONE_MATCH=transactions_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'ETAG000002')
+        # The balance shown on the customer list changed too
+        self.assertEqual(self.client.get(reverse('customer_list'), HTTP_IF_NONE_MATCH=customers_etag).status_code, 200)
+
+        transactions_etag = response['ETag']
+        self.customer_a.Name = 'Etag Renamed'
+        self.customer_a.save()
+        response = self.client.get(reverse('transaction_list'), HTTP_IF_NONE_MATCH=transactions_etag)
+        self.assertContains(response, 'Etag Renamed')
+
+    def test_enquiry_etag_is_per_account(self):
+        url = reverse('enquiry_transaction_details', args=[self.customer_a.Account])
+        etag = self.client.get(url)['ETag']
+
+        self.post(self.customer_b, 'ETAG000003')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.post(self.customer_a, 'ETAG000004')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'ETAG000004')
+
+class SortHeaderTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        customer = Customer.objects.create(Account='CUSTSORTHEAD001', Name='Sort Header', Balance=Decimal('0.00'))
+        Transaction.objects.create(Account=customer, Date=timezone.now(), Amount=Decimal('1.00'), DC='D',
+                                   Reference='SORTHEAD01')
+
+    def headers(self, response):
+        return {header.label: header for header in response.context['sort_headers']}
+
+    def test_headers_describe_current_sort_and_next_url(self):
+        response = self.client.get(reverse('transaction_list'), {
+            'sort_by': ['Amount', 'Date'], 'order': ['desc', 'asc'], 'q': 'SORT', 'after': 'stale'})
+        headers = self.headers(response)
+        self.assertEqual((headers['Amount'].arrow, headers['Amount'].priority), ('▼', 1))
+        self.assertEqual((headers['Date'].arrow, headers['Date'].priority), ('▲', 2))
+        self.assertEqual((headers['Number'].arrow, headers['Number'].priority), ('', None))
+        # Clicking a secondary column makes it primary; cursors are dropped
+        self.assertEqual(headers['Date'].url,
+                         reverse('transaction_list') + '?q=SORT&sort_by=Date&sort_by=Amount&order=asc&order=desc')
+        # Clicking the primary column reverses it
+        self.assertIn('sort_by=Amount&sort_by=Date&order=asc&order=asc', headers['Amount'].url)
+        self.assertContains(response, headers['Date'].url.replace('&', '&amp;'))
+
+    def test_single_sort_has_no_priority(self):
+        headers = self.headers(self.client.get(reverse('customer_list'), {'sort_by': 'Name', 'order': 'asc'}))
+        self.assertEqual((headers['Name'].arrow, headers['Name'].priority), ('▲', None))
+        self.assertIn('sort_by=Name&order=desc', headers['Name'].url)
+
+    def test_unknown_sort_fields_are_rejected_before_querying(self):
+        for url, params in ((reverse('transaction_list'), {'sort_by': ['Bogus', 'Amount'], 'order': ['asc', 'desc']}),
+                            (reverse('customer_list'), {'sort_by': 'Account__Name', 'order': 'asc'}),
+                            (reverse('transaction_export'), {'sort_by': 'Nope', 'order': 'asc'}),
+                            (reverse('enquiry_transaction_details', args=['CUSTSORTHEAD001']), {'sort_by': 'Nope'})):
+            with self.subTest(url=url):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('transaction_list'), {'sort_by': ['Bogus', 'Amount'], 'order': ['asc', 'desc']})
+        self.assertEqual(response.context['sort_fields'], ['Amount'])
+        self.assertEqual(response.context['sort_orders'], ['desc'])
+        self.assertContains(response, 'Cannot sort by &quot;Bogus&quot;.')
+
+    def test_sort_without_order_defaults_to_ascending(self):
+        response = self.client.get(reverse('transaction_list'), {'sort_by': 'Amount'})
+        self.assertEqual(response.context['sort_fields'], ['Amount'])
+        self.assertEqual(response.context['sort_orders'], ['asc'])
+
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(Account='CUSTASYNC000001', Name='Async Customer', Balance=Decimal('0.00'))
+        post_transactions([
+            Transaction(Account=cls.customer, Date=timezone.now(), Amount=Decimal(i + 1), DC='D',
+                        Reference=f'ASYNC{i:05d}')
+            for i in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_read_views_are_coroutines(self):
+        from asgiref.sync import iscoroutinefunction
+        from core import views
+        for view in (views.customer_list, views.transaction_list, views.enquiry_customer_list,
+                     views.enquiry_transaction_details):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+    async def test_views_through_asgi_handler(self):
+        response = await self.async_client.get(reverse('transaction_list'), {'sort_by': 'Amount', 'order': 'desc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t.Reference for t in response.context['transactions']],
+                         ['ASYNC00002', 'ASYNC00001', 'ASYNC00000'])
+
+        response = await self.async_client.get(reverse('customer_list'), {'q': 'Async'})
+        self.assertContains(response, 'Async Customer')
+
+        response = await self.async_client.get(reverse('enquiry_customer_list'))
+        self.assertContains(response, 'Async Customer')
+
+        url = reverse('enquiry_transaction_details', args=[self.customer.Account])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'ASYNC00001')
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(reverse('enquiry_transaction_details', args=['NOSUCHACCOUNT00']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_requests_are_measured(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        await self.async_client.get(reverse('transaction_list'))
+        body = (await self.async_client.get(reverse('metrics'))).content.decode()
+        # Version lookup and the page query, seen from the ORM's worker thread
+        self.assertIn('sales_http_request_queries_sum{view="transaction_list"} 2', body)
+
+
+class ArchiveTransactionsTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.customer = Customer.objects.create(Account='CUSTARCHIVE0001', Name='Archivist', Balance=Decimal('100.00'))
+        now = timezone.now()
+        # Six transactions from about seven months ago, four from the last week
+        post_transactions([
+            Transaction(Account=self.customer, Date=now - timedelta(days=days), Amount=Decimal(days % 7),
+                        DC='C' if days % 3 == 0 else 'D', Reference=f'ARCHIVE{days:03d}')
+            for days in [200, 201, 202, 203, 204, 205, 1, 2, 3, 4]
+        ])
+        self.old_date = (now - timedelta(days=210)).strftime('%Y-%m-%d')
+
+    def _archive(self):
+        out = StringIO()
+        call_command('archive_transactions', older_than=90, chunk_size=4, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def _numbers(self, url, params):
+        numbers = []
+        response = self.client.get(url, params)
+        while True:
+            numbers.extend(t.Number for t in response.context['transactions'])
+            if not response.context.get('next_query'):
+                return numbers
+            response = self.client.get(url + '?' + response.context['next_query'])
+
+    def _snapshot(self):
+        return sorted(DailyAccountTotals.objects.filter(Count__gt=0).values_list(
+            'Account_id', 'Day', 'DebitTotal', 'CreditTotal', 'Count'))
+
+    def _balance(self, at):
+        response = self.client.get(reverse('enquiry_balance_at', args=[self.customer.Account]), {'at': at})
+        return response.json()['balance']
+
+    def test_archiving_keeps_balances_and_rollups(self):
+        balance = Customer.objects.get(pk=self.customer.pk).Balance
+        rollup = self._snapshot()
+        old_balance = self._balance(self.old_date)
+
+        self.assertIn('Archived 6 transactions', self._archive())
+        self.assertEqual(Transaction.objects.filter(Account=self.customer).count(), 4)
+        self.assertEqual(ArchivedTransaction.objects.filter(Account=self.customer).count(), 6)
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).Balance, balance)
+        self.assertEqual(self._snapshot(), rollup)
+        self.assertEqual(self._balance(self.old_date), old_balance)
+
+        # Rebuilding the derived figures still counts archived transactions
+        call_command('rebuild_daily_totals', stdout=StringIO())
+        self.assertEqual(self._snapshot(), rollup)
+        call_command('checkpoint_balances', days=30, stdout=StringIO())
+        self.assertEqual(self._balance(self.old_date), old_balance)
+        self.assertIn('Archived 0 transactions', self._archive())
+
+    def test_lists_read_archive_only_when_date_filter_reaches_it(self):
+        all_numbers = list(Transaction.objects.order_by('-Amount', '-Number').values_list('Number', flat=True))
+        self._archive()
+        recent = list(Transaction.objects.values_list('Number', flat=True))
+        url = reverse('transaction_list')
+
+        self.assertEqual(sorted(self._numbers(url, {})), sorted(recent))
+        recent_start = (timezone.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        self.assertEqual(sorted(self._numbers(url, {'start_date': recent_start})), sorted(recent))
+        # Pages merge live and archived rows in sort order
+        self.assertEqual(self._numbers(url, {'start_date': self.old_date, 'sort_by': 'Amount', 'order': 'desc',
+                                             'page_size': 3}), all_numbers)
+
+        response = self.client.get(url, {'start_date': self.old_date, 'q': 'ARCHIVE200'})
+        self.assertEqual([t.Reference for t in response.context['transactions']], ['ARCHIVE200'])
+        self.assertContains(response, 'Archived')
+        self.assertNotContains(response, 'class="edit-button"')
+
+        details = reverse('enquiry_transaction_details', args=[self.customer.Account])
+        response = self.client.get(details)
+        self.assertEqual(len(response.context['transactions']), 4)
+        response = self.client.get(details, {'start_date': self.old_date, 'sort_by': 'Date', 'order': 'asc'})
+        dates = [t.Date for t in response.context['transactions']]
+        self.assertEqual(len(dates), 10)
+        self.assertEqual(dates, sorted(dates))
+
+    def test_archived_references_stay_taken(self):
+        self._archive()
+        response = self.client.post(reverse('transaction_add'), {
+            'Account': self.customer.Account, 'Date': '2025-08-11 09:00:00',
+            'Amount': '10.00', 'DC': 'D', 'Reference': 'ARCHIVE200'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Reference', response.context['form'].errors)
+        response = self.client.post(reverse('transaction_batch'), json.dumps([{
+            'Account': self.customer.Account, 'Date': '2025-08-11T09:00:00',
+            'Amount': '10.00', 'DC': 'D', 'Reference': 'ARCHIVE201'
+        }]), content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['errors'].keys(), {'Reference'})
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from core.archive import archived_until, reaches_archive
+from core.caching import report_cache_generation
+from core.metrics import registry
+from core.models import ArchivedTransaction, DailyAccountTotals, Transaction
+
+# Approximate days per bucket, for limiting the number of buckets requested
+INTERVALS = {'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 28}
+MAX_BUCKETS = 10000
+
+VOLUME_CACHE = 'core:report_volume'
+DEFAULT_REPORT_CACHE_TIMEOUT = 3600
+
+CENTS = Decimal('0.01')
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+# Day and longer buckets are truncated from the daily rollup
+ROLLUP_TRUNC = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def period_start(interval, when):
+    """Start of the ``interval`` period containing ``when``, in the current time zone."""
+    local = timezone.localtime(when)
+    if interval == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _side_total(dc):
+    return Sum(Case(When(DC=dc, then=F('Amount')), default=Value(0), output_field=AMOUNT_FIELD))
+
+
+def _bucket_querysets(interval, start, end, account, boundary):
+    """
+    Grouped queries giving (bucket, debit, credit, count) rows for ``start``
+    to before ``end``. Hours are truncated from the transactions themselves
+    through their Date index, archived ones included when the range reaches
+    back to the archived_until() ``boundary``; longer buckets are truncated from DailyAccountTotals
+    through its Day index.
+    """
+    if interval == 'hour':
+        models = [Transaction]
+        if reaches_archive(boundary, start, end):
+            models.append(ArchivedTransaction)
+        querysets = []
+        for model in models:
+            rows = model.objects.filter(Date__gte=start, Date__lt=end)
+            if account:
+                rows = rows.filter(Account=account)
+            querysets.append(rows.annotate(bucket=TruncHour('Date')).values('bucket').annotate(
+                debit=_side_total('D'), credit=_side_total('C'), count=Count('Number')).order_by())
+        return querysets
+
+    rows = DailyAccountTotals.objects.filter(Day__gte=start.date(), Day__lt=end.date())
+    if account:
+        rows = rows.filter(Account=account)
+    return [rows.annotate(bucket=ROLLUP_TRUNC[interval]('Day')).values('bucket').annotate(
+        debit=Sum('DebitTotal'), credit=Sum('CreditTotal'), count=Sum('Count')).order_by()]
+
+
+def _buckets(interval, start, end, account, boundary):
+    totals = {}
+    for queryset in _bucket_querysets(interval, start, end, account, boundary):
+        for row in queryset:
+            total = totals.setdefault(row['bucket'], [Decimal('0'), Decimal('0'), 0])
+            total[0] += row['debit'] or 0
+            total[1] += row['credit'] or 0
+            total[2] += row['count'] or 0
+    return [
+        (bucket.isoformat(), str(debit.quantize(CENTS)), str(credit.quantize(CENTS)), count)
+        for bucket, (debit, credit, count) in sorted(totals.items())
+        if count
+    ]
+
+
+def volume(interval, start, end, account=None):
+    """
+    Debit and credit totals and transaction counts per ``interval`` bucket for
+    transactions dated from ``start`` to before ``end`` (bucket boundaries in
+    the current time zone), as [(bucket, debit, credit, count)] in bucket
+    order. Buckets without transactions are left out.
+
+    Buckets before the current period are closed: they are cached together
+    for settings.REPORT_CACHE_TIMEOUT seconds, and only the open part of the
+    range is queried on every request. Writes dated in a closed period drop
+    the cache through invalidate_report_caches().
+    """
+    closed_until = min(end, max(start, period_start(interval, timezone.now())))
+    boundary = archived_until() if interval == 'hour' else None
+    rows = []
+    if start < closed_until:
+        key = (f'{VOLUME_CACHE}:{report_cache_generation()}:{interval}:{account or ""}:'
+               f'{start.isoformat()}:{closed_until.isoformat()}')
+        closed = cache.get(key)
+        registry.record_cache(VOLUME_CACHE, hit=closed is not None)
+        if closed is None:
+            closed = _buckets(interval, start, closed_until, account, boundary)
+            cache.set(key, closed, getattr(settings, 'REPORT_CACHE_TIMEOUT', DEFAULT_REPORT_CACHE_TIMEOUT))
+        rows += closed
+    if closed_until < end:
+        rows += _buckets(interval, closed_until, end, account, boundary)
+    return rows
+
+
+def closes_report_periods(transactions):
+    """Whether any of ``transactions`` is dated before the current hour, in a period reports cache."""
+    hour = period_start('hour', timezone.now())
+    for transaction in transactions:
+        date = transaction.Date
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        if date < hour:
+            return True
+    return False
@@ -9,10 +9,18 @@ urlpatterns = [
 
     path('transactions/', views.transaction_list, name='transaction_list'),
     path('transactions/add/', views.TransactionCreateView.as_view(), name='transaction_add'),
+    path('transactions/export/', views.transaction_export, name='transaction_export'),
     path('transactions/bulk_add/', views.bulk_add_transactions, name='bulk_add_transactions'),
+    path('transactions/batch/', views.transaction_batch, name='transaction_batch'),
     path('transactions/<int:pk>/edit/', views.TransactionUpdateView.as_view(), name='transaction_edit'),
     path('transactions/<int:pk>/delete/', views.TransactionDeleteView.as_view(), name='transaction_delete'),
 
     path('enquiries/', views.enquiry_customer_list, name='enquiry_customer_list'),
     path('enquiries/<str:account_number>/details/', views.enquiry_transaction_details, name='enquiry_transaction_details'),
+    path('enquiries/<str:account_number>/balance/', views.enquiry_balance_at, name='enquiry_balance_at'),
+
+    path('reports/totals/', views.report_period_totals, name='report_period_totals'),
+    path('reports/volume/', views.report_volume, name='report_volume'),
+
+    path('metrics', views.metrics, name='metrics'),
                 ]
\ No newline at end of file
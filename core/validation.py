@@ -0,0 +1,99 @@
+from django.core.exceptions import ValidationError
+
+from core.models import ArchivedTransaction, Customer, Transaction, alphanumeric_10_chars, alphanumeric_15_chars
+from core.references import is_generated_reference
+
+
+class BatchValidation:
+    """
+    Outcome of validate_transaction_batch(): the customers the batch refers
+    to, keyed by account number, and the errors found per row index.
+    """
+
+    def __init__(self):
+        self.customers = {}
+        self.errors = {}
+
+    def add_error(self, index, field, error):
+        self.errors.setdefault(index, {}).setdefault(field, []).append(error)
+
+    def row_errors(self, index):
+        """{field: [ValidationError, ...]} for one row, empty when it passed."""
+        return self.errors.get(index, {})
+
+
+def _value(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def validate_client_reference(reference):
+    """Reject a reference supplied by a client that could collide with a generated one."""
+    if is_generated_reference(reference):
+        raise ValidationError(
+            '%(value)s has the form of a generated reference; leave the Reference blank to get one.',
+            code='generated', params={'value': reference})
+
+
+def validate_transaction_batch(rows):
+    """
+    Check the Account and Reference values of a whole batch of transaction
+    rows (mappings of raw values) with a fixed number of queries:
+
+    * accounts are resolved to customers with one IN query, and those not
+      found are reported as malformed or unknown;
+    * reference formats are checked against the model validator in one pass,
+      and references of the generated form are refused;
+    * references repeated within the batch are reported on every repeat, and
+      the rest are checked against live and archived transactions with one
+      IN query.
+
+    Empty values are skipped, requiring them is up to the caller. Every bulk
+    path (the bulk add formset, the batch API and import_transactions) runs
+    its rows through here.
+    """
+    result = BatchValidation()
+    accounts = {}
+    references = {}
+    for index, row in enumerate(rows):
+        account = _value(row, 'Account')
+        if account:
+            accounts.setdefault(account, []).append(index)
+
+        reference = _value(row, 'Reference')
+        if reference:
+            try:
+                alphanumeric_10_chars(reference)
+                validate_client_reference(reference)
+            except ValidationError as e:
+                result.add_error(index, 'Reference', e)
+            else:
+                if reference in references:
+                    result.add_error(index, 'Reference',
+                                     ValidationError('Reference is repeated in this batch.', code='duplicate'))
+                else:
+                    references[reference] = index
+
+    if accounts:
+        result.customers = Customer.objects.in_bulk(list(accounts), field_name='Account')
+        for account, indexes in accounts.items():
+            if account in result.customers:
+                continue
+            try:
+                alphanumeric_15_chars(account)
+                error = ValidationError('Unknown account %(value)s.', code='unknown_account',
+                                        params={'value': account})
+            except ValidationError as e:
+                error = e
+            for index in indexes:
+                result.add_error(index, 'Account', error)
+
+    if references:
+        # Archived transactions keep their references, so both tables count
+        existing = (Transaction.objects.filter(Reference__in=list(references)).values_list('Reference', flat=True)
+                    .union(ArchivedTransaction.objects.filter(Reference__in=list(references))
+                           .values_list('Reference', flat=True)))
+        for reference in existing:
+            result.add_error(references[reference], 'Reference',
+                             Transaction().unique_error_message(Transaction, ['Reference']))
+    return result
@@ -1,22 +1,39 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
-from core.models import Customer, Transaction
-from django.db.models import Q
-from core.forms import CustomerForm, TransactionForm
-from django.forms import formset_factory
-from django.utils import timezone
-from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
-from core.models import Customer, Transaction
-from django.db.models import Q
-from core.forms import CustomerForm, TransactionForm
+import csv
+from decimal import Decimal
+from itertools import islice
+from operator import attrgetter
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.forms import formset_factory
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.db import transaction as db_transaction
-from django.contrib import messages
-from django.contrib import messages
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.views.generic import CreateView, DeleteView, UpdateView
+
+from core.archive import aarchived_until, archived_until, reaches_archive
+from core.caching import ENQUIRY_CUSTOMERS_KEY, acached_fragment
+from core.database import retry_on_lock
+from core.forms import BulkTransactionFormSet, CustomerForm, TransactionForm
+from core.jsonstream import InputTooLarge, iter_json_array
+from core.ledger import apply_ledger_effects, balance_at, post_transactions
+from core.metrics import registry as metrics_registry
+from core.models import ArchivedTransaction, Customer, DailyAccountTotals, Transaction
+from core.pagination import InvalidCursor, akeyset_paginate_many, build_ordering, keyset_paginate_many, parse_page_size
+from core.routers import primary_reads
+from core.search import annotate_rank, apply_search
+from core.sorting import parse_sort, sort_headers
+from core.timeseries import INTERVALS, MAX_BUCKETS, volume
+from core.versions import CUSTOMERS, TRANSACTIONS, account_scope, conditional_on_ledger
 
 class CustomerCreateView(CreateView):
     model = Customer
@@ -41,20 +58,22 @@ class TransactionCreateView(CreateView):
     template_name = 'core/transaction_form.html'
     success_url = reverse_lazy('transaction_list')
 
-    def form_valid(self, form):
-        try:
-            # Save the transaction first to get an instance
+    @retry_on_lock
+    def save_transaction(self, form):
+        # A retry inserts afresh: the Number given to a rolled back attempt
+        # may have been taken by another post since
+        form.instance.pk = None
+        # Insert the transaction and adjust the balance in the database
+        # (Balance = Balance + amount) so concurrent posts cannot overwrite
+        # each other's updates
+        with db_transaction.atomic():
             self.object = form.save()
+            apply_ledger_effects(added=[self.object])
 
-            # Update customer balance
-            customer = self.object.Account
-            if self.object.DC == 'D':
-                customer.Balance += self.object.Amount
-            elif self.object.DC == 'C':
-                customer.Balance -= self.object.Amount
-            customer.save()
-
-            return super().form_valid(form)
+    def form_valid(self, form):
+        try:
+            self.save_transaction(form)
+            return HttpResponseRedirect(self.get_success_url())
         except Exception as e:
             form.add_error(None, f'An error occurred: {e}')
             return self.form_invalid(form)
@@ -68,32 +87,22 @@ class TransactionUpdateView(UpdateView):
     template_name = 'core/transaction_form.html'
     success_url = reverse_lazy('transaction_list')
 
+    @retry_on_lock
     def form_valid(self, form):
-        # Get the original transaction object before saving changes
-        original_transaction = self.get_object()
-
-        # Save the updated transaction
-        self.object = form.save()
-
-        # Revert original transaction's impact on old customer's balance
-        original_customer = original_transaction.Account
-        if original_transaction.DC == 'D':
-            original_customer.Balance -= original_transaction.Amount
-        elif original_transaction.DC == 'C':
-            original_customer.Balance += original_transaction.Amount
-        original_customer.save()
-
-        # Apply new transaction's impact on new customer's balance
-        # Refresh the customer object from database to get the correct balance
-        new_customer = self.object.Account
-        new_customer.refresh_from_db()
-        if self.object.DC == 'D':
-            new_customer.Balance += self.object.Amount
-        elif self.object.DC == 'C':
-            new_customer.Balance -= self.object.Amount
-        new_customer.save()
-
-        return super().form_valid(form)
+        with db_transaction.atomic():
+            # Read the stored row; self.object already carries the form's changes
+            original = (Transaction.objects.select_for_update()
+                        .only('Account', 'Date', 'DC', 'Amount').get(pk=self.object.pk))
+
+            # Save the updated transaction
+            self.object = form.save()
+
+            # Revert the original impact and apply the new one in a single
+            # update, which also covers moving the transaction between accounts
+            # and back-dating it past balance checkpoints
+            apply_ledger_effects(added=[self.object], removed=[original])
+
+        return HttpResponseRedirect(self.get_success_url())
 
     def form_invalid(self, form):
         # This method is called when the form is invalid
@@ -105,60 +114,64 @@ class TransactionDeleteView(DeleteView):
     template_name = 'core/transaction_confirm_delete.html'
     success_url = reverse_lazy('transaction_list')
 
-    def form_valid(self, form):
-        try:
-            # Get the transaction object before deleting
-            transaction_to_delete = self.get_object()
-            customer = transaction_to_delete.Account
+    @retry_on_lock
+    def delete_transaction(self, form):
+        with db_transaction.atomic():
+            # Re-read under lock so the reverted amount is the stored one
+            self.object = Transaction.objects.select_for_update().get(pk=self.object.pk)
 
             # Revert the transaction's impact on the customer's balance
-            if transaction_to_delete.DC == 'D':
-                customer.Balance -= transaction_to_delete.Amount
-            elif transaction_to_delete.DC == 'C':
-                customer.Balance += transaction_to_delete.Amount
-            customer.save()
-
+            apply_ledger_effects(removed=[self.object])
             return super().form_valid(form)
+
+    def form_valid(self, form):
+        try:
+            return self.delete_transaction(form)
         except Exception as e:
             # This is a simple way to show the error on the confirmation page
             # A more sophisticated approach would be to use Django's messaging framework
             return render(self.request, self.template_name, {'object': self.get_object(), 'error': str(e)})
 
-def get_fuzzy_q_objects(term, fields):
-    q_objects = Q()
-    variations = [term]
-
-    # Add common misspellings or variations
-    if term.lower() == 'alice':
-        variations.extend(['alis', 'alyce'])
-    elif term.lower() == 'smith':
-        variations.extend(['smyth', 'smithe'])
-    # Add more variations as needed
-
-    for var in variations:
-        for field in fields:
-            q_objects |= Q(**{f'{field}__icontains': var})
-    return q_objects
-
-def customer_list(request):
+# Sortable columns and their header labels; sort_by values outside these are rejected
+CUSTOMER_COLUMNS = {'Account': 'Account', 'Name': 'Name', 'Balance': 'Balance'}
+TRANSACTION_COLUMNS = {
+    'Number': 'Number', 'Reference': 'Reference', 'Account__Account': 'Account',
+    'Date': 'Date', 'Amount': 'Amount', 'DC': 'Type (D/C)',
+}
+
+ENQUIRY_TRANSACTION_COLUMNS = {field: label for field, label in TRANSACTION_COLUMNS.items()
+                               if field != 'Account__Account'}
+
+async def arender(request, template_name, context):
+    """
+    render() for async views. Pass querysets already evaluated with the async
+    ORM; rendering itself runs in a worker thread because reading messages can
+    load the session from the database.
+    """
+    return await sync_to_async(render)(request, template_name, context)
+
+# The list and enquiry views below are async and read through the async ORM,
+# so under ASGI a request waiting on the database does not hold a thread.
+# Polled list and enquiry pages answer unchanged requests with 304 after a
+# single ledger version lookup
+@conditional_on_ledger(lambda request: [CUSTOMERS])
+async def customer_list(request):
     query = request.GET.get('q')
     # Handle multi-sort parameters
-    sort_fields = request.GET.getlist('sort_by')
-    sort_orders = request.GET.getlist('order')
+    sort_fields, sort_orders = parse_sort(request, CUSTOMER_COLUMNS)
     
-    # If no sort fields specified, use default
-    if not sort_fields:
-        sort_fields = ['Account']
-        sort_orders = ['asc']
-
     customers = Customer.objects.all()
 
+    match = None
     if query:
-        search_terms = query.split()
-        combined_q_objects = Q()
-        for term in search_terms:
-            combined_q_objects &= get_fuzzy_q_objects(term, ['Name', 'Account'])
-        customers = customers.filter(combined_q_objects)
+        customers, match = apply_search(customers, query, ['Name', 'Account'], phonetic=True)
+
+    # If no sort fields specified, rank search results, otherwise use default
+    if not sort_fields and match:
+        customers = annotate_rank(customers, match).order_by(F('search_rank').asc(nulls_last=True), 'Account')
+    elif not sort_fields:
+        sort_fields = ['Account']
+        sort_orders = ['asc']
 
     # Apply multi-field sorting
     sort_params = []
@@ -167,87 +180,206 @@ def customer_list(request):
             sort_params.append('-' + field)
         else:
             sort_params.append(field)
-    customers = customers.order_by(*sort_params)
+    if sort_params:
+        customers = customers.order_by(*sort_params)
 
-    return render(request, 'core/customer_list.html', {
-        'customers': customers,
+    return await arender(request, 'core/customer_list.html', {
+        'customers': [customer async for customer in customers],
         'query': query,
         'sort_fields': sort_fields,
-        'sort_orders': sort_orders
+        'sort_orders': sort_orders,
+        'sort_headers': sort_headers(request, reverse('customer_list'), CUSTOMER_COLUMNS, sort_fields, sort_orders),
     })
 
 
-def transaction_list(request):
-    query = request.GET.get('q')
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-    # Handle multi-sort parameters
-    sort_fields = request.GET.getlist('sort_by')
-    sort_orders = request.GET.getlist('order')
-    
-    # If no sort fields specified, use default
-    if not sort_fields:
-        sort_fields = ['Number']
-        sort_orders = ['asc']
+# The Account column holds the customer's account number (to_field), so the
+# list can sort on it without joining the customer table
+TRANSACTION_SORT_COLUMNS = {'Account__Account': 'Account_id'}
 
-    transactions = Transaction.objects.all()
+def transaction_ordering(sort_fields, sort_orders):
+    columns = [TRANSACTION_SORT_COLUMNS.get(field, field) for field in sort_fields]
+    return build_ordering(columns, sort_orders, tiebreak='Number')
 
-    if query:
-        search_terms = query.split()
-        combined_q_objects = Q()
-        for term in search_terms:
-            combined_q_objects &= get_fuzzy_q_objects(term, ['Account__Account', 'Amount', 'DC', 'Reference'])
-        transactions = transactions.filter(combined_q_objects)
+def has_date_range(request):
+    return bool(request.GET.get('start_date') or request.GET.get('end_date'))
+
+def read_date_range(request):
+    """
+    Parse the start_date and end_date parameters (YYYY-MM-DD) into a start
+    and an exclusive end datetime in the current time zone, either None when
+    not given or invalid. Returns (start, end, error messages).
+    """
+    start = end = None
+    errors = []
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
 
     if start_date_str:
         try:
-            start_date = timezone.datetime.strptime(start_date_str, '%Y-%m-%d')
-            transactions = transactions.filter(Date__gte=start_date)
+            start = timezone.make_aware(timezone.datetime.strptime(start_date_str, '%Y-%m-%d'))
         except ValueError:
-            messages.error(request, 'Invalid start date format. Please use YYYY-MM-DD.')
+            errors.append('Invalid start date format. Please use YYYY-MM-DD.')
 
     if end_date_str:
         try:
-            end_date = timezone.datetime.strptime(end_date_str, '%Y-%m-%d')
             # To include the entire end day, add one day and search for less than that date
-            transactions = transactions.filter(Date__lt=end_date + timezone.timedelta(days=1))
+            end = timezone.make_aware(timezone.datetime.strptime(end_date_str, '%Y-%m-%d') + timezone.timedelta(days=1))
         except ValueError:
-            messages.error(request, 'Invalid end date format. Please use YYYY-MM-DD.')
+            errors.append('Invalid end date format. Please use YYYY-MM-DD.')
+
+    return start, end, errors
+
+def parse_date_range(request):
+    """
+    read_date_range() for HTML views: invalid dates are reported with
+    messages and ignored.
+    """
+    start, end, errors = read_date_range(request)
+    for error in errors:
+        messages.error(request, error)
+    return start, end
+
+def filter_transactions(request, archive_boundary=None):
+    """
+    Apply transaction_list's search, date range and sort parameters to the
+    live transactions, and to the archived ones too when the date range
+    reaches back to ``archive_boundary``, the archived_until() date. Returns the
+    querysets to read with the effective sort fields and orders.
+    """
+    query = request.GET.get('q')
+    # Handle multi-sort parameters
+    sort_fields, sort_orders = parse_sort(request, TRANSACTION_COLUMNS)
+    
+    # If no sort fields specified, use default
+    if not sort_fields:
+        sort_fields = ['Number']
+        sort_orders = ['asc']
 
-    # Apply multi-field sorting
-    sort_params = []
-    for field, order in zip(sort_fields, sort_orders):
-        if order == 'desc':
-            sort_params.append('-' + field)
-        else:
-            sort_params.append(field)
-    transactions = transactions.order_by(*sort_params)
+    start, end = parse_date_range(request)
 
-    return render(request, 'core/transaction_list.html', {
-        'transactions': transactions,
+    def apply_filters(transactions):
+        transactions = transactions.select_related('Account')
+        if query:
+            transactions, _ = apply_search(transactions, query, ['Account__Account', 'Amount', 'DC', 'Reference'])
+        if start:
+            transactions = transactions.filter(Date__gte=start)
+        if end:
+            transactions = transactions.filter(Date__lt=end)
+        return transactions
+
+    querysets = [apply_filters(Transaction.objects)]
+    if reaches_archive(archive_boundary, start, end):
+        querysets.append(apply_filters(ArchivedTransaction.objects))
+    return querysets, sort_fields, sort_orders
+
+
+@conditional_on_ledger(lambda request: [TRANSACTIONS])
+async def transaction_list(request):
+    query = request.GET.get('q')
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+    # Only a date filter can reach back into the archive
+    archive_boundary = await aarchived_until() if has_date_range(request) else None
+    querysets, sort_fields, sort_orders = filter_transactions(request, archive_boundary)
+
+    # Keyset pagination over the multi-field sort, with Number as the tiebreak
+    # (archived transactions keep their Number, so it is unique across both)
+    ordering = transaction_ordering(sort_fields, sort_orders)
+    page_size = parse_page_size(request.GET.get('page_size'))
+    try:
+        page = await akeyset_paginate_many(querysets, ordering,
+                                           after=request.GET.get('after'),
+                                           before=request.GET.get('before'),
+                                           page_size=page_size)
+    except InvalidCursor:
+        messages.error(request, 'Invalid page cursor. Showing the first page.')
+        page = await akeyset_paginate_many(querysets, ordering, page_size=page_size)
+
+    next_query = previous_query = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params.pop('before', None)
+        params['after'] = page.next_cursor
+        next_query = params.urlencode()
+    if page.previous_cursor:
+        params = request.GET.copy()
+        params.pop('after', None)
+        params['before'] = page.previous_cursor
+        previous_query = params.urlencode()
+
+    return await arender(request, 'core/transaction_list.html', {
+        'transactions': page,
+        'next_query': next_query,
+        'previous_query': previous_query,
         'query': query,
         'start_date': start_date_str,
         'end_date': end_date_str,
         'sort_fields': sort_fields,
-        'sort_orders': sort_orders
+        'sort_orders': sort_orders,
+        'sort_headers': sort_headers(request, reverse('transaction_list'), TRANSACTION_COLUMNS, sort_fields, sort_orders),
     })
 
 
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
 
+    def write(self, value):
+        return value
 
 
+EXPORT_CHUNK_SIZE = 2000
 
-def enquiry_customer_list(request):
-    customers = Customer.objects.all()
-    return render(request, 'core/enquiry_customer_list.html', {'customers': customers})
+def transaction_export(request):
+    # A download has no page to show messages on, so bad dates fail it
+    # instead of exporting everything unfiltered
+    _, _, errors = read_date_range(request)
+    if errors:
+        return HttpResponse(' '.join(errors), status=400, content_type='text/plain; charset=utf-8')
+    querysets, sort_fields, sort_orders = filter_transactions(
+        request, archived_until() if has_date_range(request) else None)
+    ordering = transaction_ordering(sort_fields, sort_orders)
 
-def enquiry_transaction_details(request, account_number):
-    customer = get_object_or_404(Customer, Account=account_number)
+    def rows():
+        writer = csv.writer(Echo())
+        yield writer.writerow(['Number', 'Reference', 'Account', 'Name', 'Date', 'Amount', 'DC'])
+        # Walk the result in keyset chunks so only one chunk is held in memory
+        cursor = None
+        while True:
+            page = keyset_paginate_many(querysets, ordering, after=cursor, page_size=EXPORT_CHUNK_SIZE)
+            for t in page:
+                yield writer.writerow([t.Number, t.Reference, t.Account.Account, t.Account.Name,
+                                       t.Date.isoformat(), t.Amount, t.DC])
+            cursor = page.next_cursor
+            if not cursor:
+                break
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
+    return response
+
+
+
+
+async def enquiry_customer_list(request):
+    async def render_grid():
+        # The cached grid outlives replication lag and is only invalidated by
+        # writes, so it is always filled from the primary
+        with primary_reads():
+            customers = [customer async for customer in Customer.objects.all()]
+        return render_to_string('core/enquiry_customer_grid.html', {'customers': customers})
+
+    customer_grid = await acached_fragment(ENQUIRY_CUSTOMERS_KEY, render_grid)
+    return await arender(request, 'core/enquiry_customer_list.html', {'customer_grid': customer_grid})
+
+@conditional_on_ledger(lambda request, account_number: [account_scope(account_number)])
+async def enquiry_transaction_details(request, account_number):
+    customer = await aget_object_or_404(Customer, Account=account_number)
     
     sort_by = request.GET.get('sort_by', '-Date') # Default sort by Date descending
     order = request.GET.get('order', 'asc') # Default order ascending (will be overridden by -Date initially)
-
-    transactions = Transaction.objects.filter(Account=customer)
+    if sort_by.replace('-', '') not in ENQUIRY_TRANSACTION_COLUMNS:
+        messages.error(request, f'Cannot sort by "{sort_by}".')
+        sort_by, order = '-Date', 'asc'
 
     # Apply sorting
     if order == 'desc':
@@ -255,16 +387,36 @@ def enquiry_transaction_details(request, account_number):
     else:
         sort_by = sort_by.replace('-', '') # Ensure it's ascending
 
-    transactions = transactions.order_by(sort_by)
+    start, end = parse_date_range(request)
 
-    return render(request, 'core/enquiry_transaction_details.html', {
+    def account_transactions(model):
+        transactions = model.objects.filter(Account=customer)
+        if start:
+            transactions = transactions.filter(Date__gte=start)
+        if end:
+            transactions = transactions.filter(Date__lt=end)
+        return transactions.order_by(sort_by)
+
+    transactions = [transaction async for transaction in account_transactions(Transaction)]
+    archive_boundary = await aarchived_until() if start or end else None
+    if reaches_archive(archive_boundary, start, end):
+        transactions += [transaction async for transaction in account_transactions(ArchivedTransaction)]
+        transactions.sort(key=attrgetter(sort_by.lstrip('-')), reverse=sort_by.startswith('-'))
+
+    dates = {name: request.GET[name] for name in ('start_date', 'end_date') if request.GET.get(name)}
+    return await arender(request, 'core/enquiry_transaction_details.html', {
         'customer': customer,
         'transactions': transactions,
         'sort_by': sort_by.replace('-', ''), # Pass original field name to template
-        'order': order
+        'order': order,
+        'start_date': dates.get('start_date'),
+        'end_date': dates.get('end_date'),
+        'date_query': urlencode(dates),
     })
 
 
+BULK_ADD_MAX_FORMS = 5000
+
 def bulk_add_transactions(request):
     num_forms = request.GET.get('num_forms', 3) # Default to 3 forms
     try:
@@ -272,34 +424,228 @@ def bulk_add_transactions(request):
     except ValueError:
         num_forms = 3 # Fallback if not a valid number
 
-    DynamicTransactionFormSet = formset_factory(TransactionForm, extra=num_forms)
+    num_forms = max(0, min(num_forms, BULK_ADD_MAX_FORMS))
+
+    DynamicTransactionFormSet = formset_factory(TransactionForm, formset=BulkTransactionFormSet, extra=num_forms,
+                                                max_num=BULK_ADD_MAX_FORMS, absolute_max=BULK_ADD_MAX_FORMS)
 
     if request.method == 'POST':
         formset = DynamicTransactionFormSet(request.POST)
         if formset.is_valid():
             try:
-                with db_transaction.atomic():
-                    customer_balances = {}
-                    for form in formset:
-                        if form.has_changed(): # Only process forms that have data
-                            transaction = form.save(commit=False)
-                            customer = transaction.Account
-                            if customer.pk not in customer_balances:
-                                customer_balances[customer.pk] = customer.Balance
-
-                            if transaction.DC == 'D':
-                                customer_balances[customer.pk] += transaction.Amount
-                            elif transaction.DC == 'C':
-                                customer_balances[customer.pk] -= transaction.Amount
-                            transaction.save()
-
-                    for pk, balance in customer_balances.items():
-                        Customer.objects.filter(pk=pk).update(Balance=balance)
-
-                    return redirect('transaction_list')
+                # Only process forms that have data; the Account on each
+                # instance is the customer resolved during validation.
+                # post_transactions() writes them in one transaction.
+                transactions = [form.save(commit=False) for form in formset if form.has_changed()]
+                post_transactions(transactions)
+
+                return redirect('transaction_list')
             except Exception as e:
                 formset.non_form_errors().append(f'An error occurred during bulk add: {e}')
     else:
         formset = DynamicTransactionFormSet()
     return render(request, 'core/bulk_add_transactions.html', {'formset': formset, 'num_forms': num_forms})
 
+
+TRANSACTION_BATCH_MAX_ROWS = BULK_ADD_MAX_FORMS
+# The body is parsed from the stream, so DATA_UPLOAD_MAX_MEMORY_SIZE does not
+# apply; this caps it instead, with room for full rows up to the row limit
+TRANSACTION_BATCH_MAX_BYTES = 4 * 1024 * 1024
+
+@csrf_exempt
+@require_POST
+def transaction_batch(request):
+    """
+    Post a JSON array of transactions, each an object with Account, Date,
+    Amount, DC and Reference. Rows are validated like the bulk add form, the
+    valid ones are written together with post_transactions(), and the
+    response reports the outcome of every row in request order.
+
+    Only application/json bodies are accepted. A cross-site form cannot send
+    that type without a CORS preflight, which is what makes the CSRF
+    exemption safe.
+    """
+    if request.content_type != 'application/json':
+        return JsonResponse({'error': 'Send the batch as application/json.'}, status=415)
+    too_large = f'A batch can be at most {TRANSACTION_BATCH_MAX_BYTES} bytes.'
+    try:
+        if int(request.META.get('CONTENT_LENGTH') or 0) > TRANSACTION_BATCH_MAX_BYTES:
+            return JsonResponse({'error': too_large}, status=413)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Content-Length.'}, status=400)
+    try:
+        # Parsed from the request stream, request.body is never read
+        rows = list(islice(iter_json_array(request, max_bytes=TRANSACTION_BATCH_MAX_BYTES),
+                           TRANSACTION_BATCH_MAX_ROWS + 1))
+    except InputTooLarge:
+        return JsonResponse({'error': too_large}, status=413)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid JSON array: {e}'}, status=400)
+    if len(rows) > TRANSACTION_BATCH_MAX_ROWS:
+        return JsonResponse({'error': f'A batch can hold at most {TRANSACTION_BATCH_MAX_ROWS} transactions.'},
+                            status=400)
+
+    results = [None] * len(rows)
+    objects = []
+    for index, row in enumerate(rows):
+        if isinstance(row, dict):
+            objects.append((index, row))
+        else:
+            results[index] = {'index': index, 'status': 'error',
+                              'errors': {'__all__': [{'message': 'Expected a JSON object.', 'code': 'invalid'}]}}
+
+    data = {'form-TOTAL_FORMS': str(len(objects)), 'form-INITIAL_FORMS': '0'}
+    for i, (_, row) in enumerate(objects):
+        for field in TransactionForm._meta.fields:
+            value = row.get(field)
+            data[f'form-{i}-{field}'] = '' if value is None else str(value)
+    BatchFormSet = formset_factory(TransactionForm, formset=BulkTransactionFormSet, extra=0,
+                                   max_num=TRANSACTION_BATCH_MAX_ROWS, absolute_max=TRANSACTION_BATCH_MAX_ROWS)
+    # Every row is required, unlike the blank extra rows of the HTML form
+    formset = BatchFormSet(data, form_kwargs={'empty_permitted': False})
+    formset.is_valid()
+
+    valid = []
+    for (index, _), form in zip(objects, formset.forms):
+        if form.is_valid():
+            valid.append((index, form))
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': form.errors.get_json_data()}
+
+    try:
+        created = post_transactions([form.save(commit=False) for _, form in valid])
+    except IntegrityError as e:
+        # A reference taken by a concurrent write since validation
+        return JsonResponse({'error': f'The batch was not written: {e}'}, status=409)
+    for (index, _), transaction in zip(valid, created):
+        results[index] = {'index': index, 'status': 'created', 'number': transaction.Number}
+
+    return JsonResponse({'created': len(created), 'failed': len(rows) - len(created), 'results': results})
+
+
+def enquiry_balance_at(request, account_number):
+    customer = get_object_or_404(Customer, Account=account_number)
+
+    at_str = request.GET.get('at')
+    if at_str:
+        try:
+            # A bare date means the balance at the end of that day
+            day = parse_date(at_str)
+            if day:
+                at = timezone.datetime.combine(day, timezone.datetime.max.time())
+            else:
+                at = parse_datetime(at_str)
+        except ValueError:
+            at = None
+        if at is None:
+            return JsonResponse({'error': 'Invalid "at" timestamp. Use ISO 8601, e.g. 2025-08-11T12:00:00.'}, status=400)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+    else:
+        at = timezone.now()
+
+    return JsonResponse({
+        'account': customer.Account,
+        'at': at.isoformat(),
+        'balance': str(balance_at(customer, at)),
+    })
+
+
+CENTS = Decimal('0.01')
+
+def report_period_totals(request):
+    """
+    Debit/credit totals and transaction counts for a date range, answered from
+    the DailyAccountTotals rollup rather than the raw ledger.
+    """
+    totals = DailyAccountTotals.objects.all()
+
+    for param, lookup in (('start_date', 'Day__gte'), ('end_date', 'Day__lte')):
+        value = request.GET.get(param)
+        if value:
+            try:
+                totals = totals.filter(**{lookup: timezone.datetime.strptime(value, '%Y-%m-%d').date()})
+            except ValueError:
+                return JsonResponse({'error': f'Invalid {param} format. Please use YYYY-MM-DD.'}, status=400)
+
+    account = request.GET.get('account')
+    if account:
+        totals = totals.filter(Account=account)
+
+    amount_field = DecimalField(max_digits=14, decimal_places=2)
+    sums = {
+        'debit_total': Coalesce(Sum('DebitTotal'), Value(Decimal('0')), output_field=amount_field),
+        'credit_total': Coalesce(Sum('CreditTotal'), Value(Decimal('0')), output_field=amount_field),
+        'count': Coalesce(Sum('Count'), Value(0)),
+    }
+
+    def serialise(row):
+        return {
+            'debit_total': str(row['debit_total'].quantize(CENTS)),
+            'credit_total': str(row['credit_total'].quantize(CENTS)),
+            'count': row['count'],
+        }
+
+    data = {
+        'start_date': request.GET.get('start_date'),
+        'end_date': request.GET.get('end_date'),
+        'account': account,
+        **serialise(totals.aggregate(**sums)),
+    }
+    if request.GET.get('group_by') == 'account':
+        data['accounts'] = [
+            {'account': row['Account_id'], **serialise(row)}
+            for row in totals.values('Account_id').annotate(**sums).order_by('Account_id')
+        ]
+    return JsonResponse(data)
+
+
+REPORT_VOLUME_DAYS = 30
+
+def report_volume(request):
+    """
+    Debit/credit totals and transaction counts per hour, day, week or month
+    for a date range (the last 30 days by default), as parallel arrays with
+    one entry per non-empty bucket. Bucketing happens in SQL; see
+    core.timeseries.volume().
+    """
+    interval = request.GET.get('interval', 'day')
+    if interval not in INTERVALS:
+        return JsonResponse({'error': f'Invalid interval. Use one of: {", ".join(INTERVALS)}.'}, status=400)
+
+    dates = {}
+    for param in ('start_date', 'end_date'):
+        value = request.GET.get(param)
+        if value:
+            try:
+                dates[param] = timezone.datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                return JsonResponse({'error': f'Invalid {param} format. Please use YYYY-MM-DD.'}, status=400)
+    end_date = dates.get('end_date') or timezone.localdate()
+    start_date = dates.get('start_date') or end_date - timezone.timedelta(days=REPORT_VOLUME_DAYS - 1)
+    if start_date > end_date:
+        return JsonResponse({'error': 'start_date must not be after end_date.'}, status=400)
+    if ((end_date - start_date).days + 1) / INTERVALS[interval] > MAX_BUCKETS:
+        return JsonResponse({'error': f'The range spans more than {MAX_BUCKETS} {interval} buckets.'}, status=400)
+
+    start = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
+    end = timezone.make_aware(timezone.datetime.combine(end_date + timezone.timedelta(days=1),
+                                                        timezone.datetime.min.time()))
+    account = request.GET.get('account') or None
+    rows = volume(interval, start, end, account)
+
+    return JsonResponse({
+        'interval': interval,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'account': account,
+        'buckets': [row[0] for row in rows],
+        'debit': [row[1] for row in rows],
+        'credit': [row[2] for row in rows],
+        'count': [row[3] for row in rows],
+    }, json_dumps_params={'separators': (',', ':')})
+
+
+def metrics(request):
+    # Prometheus text exposition format, version 0.0.4
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,13 +76,104 @@ WSGI_APPLICATION = 'sales_app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#
+# SQLite is set up for concurrent use: WAL lets readers run while a write
+# commits, writes take the write lock when their transaction begins
+# (IMMEDIATE) so two writers cannot deadlock upgrading a read lock, and a
+# locked database is waited on for `timeout` seconds (SQLite's busy_timeout)
+# before the write is retried with backoff (core.database.retry_on_lock). Connections are kept
+# for CONN_MAX_AGE seconds, so the pragmas run once per connection rather
+# than once per request. `manage.py benchmark_contention` compares this
+# profile with SQLite's defaults.
+#
+# Setting REPLICA_DB_PATH adds a `replica` database, a copy of the primary
+# refreshed by `manage.py replicate_db --interval N`, and routes the list and
+# enquiry views' reads to it (core.routers). Reads stay on the primary while
+# the copy is missing, unmigrated or older than REPLICA_MAX_LAG_SECONDS, and
+# for REPLICA_PIN_SECONDS after a client's own write; both should exceed the
+# replication interval. Tests mirror the replica onto the primary.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+            ),
+        },
+    },
+}
+
+REPLICA_DB_PATH = os.environ.get('REPLICA_DB_PATH')
+if REPLICA_DB_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DB_PATH,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 5,
+            'init_command': (
+                'PRAGMA query_only=ON;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+            ),
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = 60
+REPLICA_MAX_LAG_SECONDS = 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Cached customer pages are invalidated on every customer and balance write
+# made by this process. Writes from other processes (management commands,
+# other workers) only reach a local-memory cache when CUSTOMER_CACHE_TIMEOUT
+# expires; switch to FileBasedCache to share invalidation between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sales-app',
     }
 }
 
+CUSTOMER_CACHE_TIMEOUT = 300
+
+# Closed periods of /reports/volume/ are cached for this long. Writes dated in
+# a closed period (before the current hour) drop them, with the same
+# per-process caveat as above.
+REPORT_CACHE_TIMEOUT = 3600
+
+
+# Bulk add posts five fields per transaction row; allow a full batch of
+# core.views.BULK_ADD_MAX_FORMS rows plus the management form.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 30000
+
+# Transactions posted without a Reference get REFERENCE_PREFIX followed by a
+# zero-padded number. Each thread reserves REFERENCE_BLOCK_SIZE numbers at a
+# time from core_referencesequence.
+REFERENCE_PREFIX = 'R'
+REFERENCE_BLOCK_SIZE = 1000
+
+# Requests slower than this are logged to the core.metrics logger together
+# with the SQL they ran. Per-view metrics are served at /metrics.
+SLOW_REQUEST_MS = 1000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators